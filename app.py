@@ -1,281 +1,404 @@
-# =============================================
-# Samukelo's Personal Codex Agent (Streamlit)
-# Multi-turn chat + RAG + Gemini API (deploy-friendly)
-# =============================================
-
-import os
-import google.generativeai as genai
-import re
-from datetime import datetime
-import streamlit as st
-
-# RAG helpers (ensure these files exist in rag/)
-from rag.build_index import build_or_load_index, get_data_signature   # auto-rebuild enabled
-from rag.retriever import retrieve
-from rag.prompts import BASE_SYSTEM, MODES, QUESTION_HINTS
-
-
-# --------------------------
-# Page setup
-# --------------------------
-st.set_page_config(page_title="Personal Codex", page_icon="💬")
-st.title("Samukelo’s Personal Codex Agent")
-
-
-# --------------------------
-# Session state defaults
-# --------------------------
-if "messages" not in st.session_state:
-    # conversation history: list of {"role": "user"|"assistant", "content": str}
-    st.session_state.messages = []
-if "mode" not in st.session_state:
-    st.session_state.mode = "Interview mode"
-if "copy_buffer" not in st.session_state:
-    st.session_state.copy_buffer = ""
-
-
-# --------------------------
-# Gemini API helper
-# --------------------------
-def call_gemini(prompt: str, model: str = "gemini-2.0-flash") -> str:
-    key = os.environ.get("GEMINI_API_KEY", "")
-    if not key:
-        return "⚠️ Missing GEMINI_API_KEY. Set it in Streamlit Cloud → Secrets."
-    try:
-        genai.configure(api_key=key)
-        m = genai.GenerativeModel(model)
-        resp = m.generate_content(prompt)
-        return resp.text or ""
-    except Exception as e:
-        return f"⚠️ Gemini error: {e}"
-
-# --------------------------
-# Sidebar controls
-# --------------------------
-with st.sidebar:
-    st.header("Settings")
-
-    # Tone/style mode (affects answer instruction)
-    st.session_state.mode = st.selectbox(
-        "Answer mode",
-        list(MODES.keys()),
-        index=list(MODES.keys()).index(st.session_state.mode)
-    )
-
-    # Retriever depth
-    top_k = st.slider(
-        "Retriever k",
-        min_value=3,
-        max_value=10,
-        value=5
-    )
-
-    st.markdown("---")
-    st.caption("Try a sample question")
-    sample = st.selectbox("Samples", ["(Choose)"] + QUESTION_HINTS)
-    if sample != "(Choose)":
-        st.info(f"Selected sample: {sample}. Type it below or press Enter to send.")
-
-    st.markdown("---")
-
-    if st.button("Clear chat"):
-        st.session_state.messages = []
-        st.session_state.copy_buffer = ""
-        st.rerun()
-    
-    if st.button("Copy last answer"):
-        last_ai = next((m for m in reversed(st.session_state.messages) if m["role"] == "assistant"), None)
-        st.session_state.copy_buffer = last_ai["content"] if last_ai else ""
-
-    if st.session_state.copy_buffer:
-        st.text_area("Copy from here:", st.session_state.copy_buffer, height=120)
-
-    # Dataset management (add/update files)
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Dataset")
-
-    DATA_DIR = "data"
-    os.makedirs(DATA_DIR, exist_ok=True)
-
-    # 1) Upload one or more files into /data
-    uploads = st.sidebar.file_uploader(
-        "Add files (.md, .txt, .pdf)",
-        type=["md", "txt", "pdf"],
-        accept_multiple_files=True
-    )
-
-    if uploads:
-        if st.sidebar.button("Save uploads to dataset"):
-            saved = 0
-            for f in uploads:
-                # Keep original name if possible; fallback to a safe name
-                fname = f.name if f.name else f"upload_{saved}.md"
-                path = os.path.join(DATA_DIR, fname)
-                with open(path, "wb") as out:
-                    out.write(f.read())
-                saved += 1
-
-            # Flag a rebuild and rerun
-            st.session_state["__new_files_added"] = True
-            st.sidebar.success(f"Saved {saved} file(s) to /data")
-            st.rerun()
-
-    # 2) Quick note -> create a new .md file inside /data
-    with st.sidebar.expander("✍️ Quick note (.md)", expanded=False):
-        note_title = st.text_input("Filename (no spaces, ends with .md)", value="new_note.md")
-        note_text = st.text_area("Content (Markdown)")
-
-        if st.button("Save note to dataset"):
-            # basic guard: ensure .md extension
-            if not note_title.lower().endswith(".md"):
-                note_title += ".md"
-            # sanitize filename a little
-            safe_name = note_title.replace(" ", "_").replace("/", "_")
-            path = os.path.join(DATA_DIR, safe_name)
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(note_text or "")
-            st.session_state["__new_files_added"] = True
-            st.sidebar.success(f"Saved {safe_name} to /data")
-            st.rerun()
-
-_CIT_PATTERNS = [
-    r"\(\s*Doc[s]?\s*[\d,\s]+\)",
-    r"\[\s*Doc[s]?\s*[\d,\s]+\s*\]",
-    r"\[\s*\d+(?:\s*,\s*\d+)*\s*\]",
-    r"\(\s*\d+(?:\s*,\s*\d+)*\s*\)",
-]
-def clean_answer(text: str) -> str:
-    for pat in _CIT_PATTERNS:
-        text = re.sub(pat, "", text)
-    # remove double spaces left behind
-    return re.sub(r"\s{2,}", " ", text).strip()
-# --------------------------
-# Index: build or load once, keyed by data signature
-# --------------------------
-@st.cache_resource
-def _load_vs(signature: str, force: bool = False):
-    return build_or_load_index(
-        index_dir="index",
-        data_dir="data",
-        data_signature=signature,
-        force_rebuild=force,
-    )
-
-# Compute signature on every run (fast)
-data_sig = get_data_signature("data")
-#st.caption(f"Index status: signature {data_sig[:8]}…")
-
-# Rebuild button
-if st.sidebar.button("Rebuild index now"):
-    vs = _load_vs(data_sig, force=True)
-    st.sidebar.success("Index rebuilt.")
-else:
-    vs = _load_vs(data_sig, force=False)
-
-
-# --------------------------
-# Prompt builder
-# --------------------------
-def build_llm_prompt(
-    user_q: str,
-    retrieved_context: str,
-    mode_key: str,
-    chat_history: list[dict],
-    max_turns: int = 5
-) -> str:
-    """
-    Creates the prompt for the LLM.
-    - Injects BASE_SYSTEM and the selected stylistic MODE.
-    - Includes the last `max_turns` of chat for light conversational memory.
-    - Adds retrieved context and current user question.
-    """
-    style = MODES[mode_key]
-
-    # Keep just the last N turns (each turn ~ user+assistant)
-    recent = chat_history[-max_turns * 2:]
-    history_lines = []
-    history_lines = [
-        f"{'User' if m['role']=='user' else 'Assistant'}: {m['content']}" for m in recent
-    ]
-    history_text = "\n".join(history_lines) if history_lines else "(no previous turns)"
-
-    return f"""{BASE_SYSTEM}
-
-STYLE: {style}
-
-RECENT CHAT (for continuity):
-\"\"\"
-{history_text}
-\"\"\"
-
-CONTEXT (from Samukelo's docs):
-\"\"\"
-{retrieved_context}
-\"\"\"
-
-CURRENT QUESTION:
-{user_q}
-
-Answer as Samukelo (first-person). Be specific and grounded in the CONTEXT when applicable.
-If the answer is not in context, say so briefly and avoid fabrications.
-"""
-
-# --------------------------
-# Render chat history
-# --------------------------
-for msg in st.session_state.messages:
-    with st.chat_message("user" if msg["role"] == "user" else "assistant"):
-        st.markdown(msg["content"])
-
-
-# --------------------------
-# Chat input
-# --------------------------
-placeholder = sample if sample != "(Choose)" else "Ask something like: What kind of engineer are you?"
-user_input = st.chat_input(placeholder=placeholder)
-
-# If user submits a message
-if user_input:
-    # 1) Append user's message to history and render immediately
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    with st.chat_message("user"):
-        st.markdown(user_input)
-
-    # 2) Retrieve context from FAISS for this question
-    try:
-        retrieved_context, _ = retrieve(vs, user_input, k=top_k)
-    except Exception as e:
-        with st.chat_message("assistant"):
-            st.error("Failed to retrieve context from the index.")
-            st.exception(e)
-        st.stop()
-
-    # 3) Build prompt text for the model
-    prompt_text = build_llm_prompt(
-        user_q=user_input,
-        retrieved_context=retrieved_context,
-        mode_key=st.session_state.mode,
-        chat_history=st.session_state.messages,
-        max_turns=5
-    )
-
-    # 4) Call Gemini API
-    answer = call_gemini(prompt_text)
-    answer = clean_answer(answer)
-    
-    # 5) Append assistant response to history and render
-    st.session_state.messages.append({"role": "assistant", "content": answer})
-    with st.chat_message("assistant"):
-        st.markdown(answer)
-
-    # 6) Per-turn retrieved context (collapsible)
-    #with st.expander("Retrieved Context"):
-    #    st.code(retrieved_context)
-
-
-
-
-# --------------------------
-# Footer
-# --------------------------
-st.caption(f"Session started: {datetime.now().strftime('%Y-%m-%d')}. Powered by FAISS + HF Inference API.")
+# =============================================
+# Samukelo's Personal Codex Agent (Streamlit)
+# Multi-turn chat + RAG + Gemini API (deploy-friendly)
+# =============================================
+
+import os
+from datetime import datetime
+from collections import deque
+
+# time the imports below (and the warm-up's) for the startup report; stdlib-only
+from rag.startup import WarmUp, startup_profile
+startup_profile.install()
+
+import streamlit as st
+
+# RAG helpers (ensure these files exist in rag/)
+from rag.background import BackgroundIndexBuilder
+from rag.watcher import DataWatcher            # auto-rebuild enabled
+from rag.metrics import Tracer, span
+from rag.retriever import metadata_index, query_embedding, retrieve
+from rag.response_cache import ResponseCache, context_key, is_context_dependent
+from rag.context import pack_context, estimate_tokens
+from rag.memory import ConversationMemory
+from rag.prompts import MODES, QUESTION_HINTS, build_llm_prompt
+from rag.llm import DEFAULT_MODEL, GenerationStats, get_backend, stream_answer
+
+
+# --------------------------
+# Page setup
+# --------------------------
+st.set_page_config(page_title="Personal Codex", page_icon="💬")
+st.title("Samukelo’s Personal Codex Agent")
+
+
+# --------------------------
+# Session state defaults
+# --------------------------
+if "messages" not in st.session_state:
+    # conversation history: list of {"role": "user"|"assistant", "content": str}
+    st.session_state.messages = []
+if "mode" not in st.session_state:
+    st.session_state.mode = "Interview mode"
+if "memory" not in st.session_state:
+    # bounded prompt history: recent turns verbatim, older ones in a rolling summary
+    st.session_state.memory = ConversationMemory(max_recent=10, max_stored=40)
+if "copy_buffer" not in st.session_state:
+    st.session_state.copy_buffer = ""
+if "last_generation" not in st.session_state:
+    # GenerationStats of the most recent answer (time to first token, total time)
+    st.session_state.last_generation = None
+
+
+# --------------------------
+# Sidebar controls
+# --------------------------
+with st.sidebar:
+    st.header("Settings")
+
+    # Tone/style mode (affects answer instruction)
+    st.session_state.mode = st.selectbox(
+        "Answer mode",
+        list(MODES.keys()),
+        index=list(MODES.keys()).index(st.session_state.mode)
+    )
+
+    # Retriever depth
+    top_k = st.slider(
+        "Retriever k",
+        min_value=3,
+        max_value=10,
+        value=5
+    )
+
+    # Relevance/diversity trade-off (MMR); 1.0 = plain top-k by similarity
+    mmr_lambda = st.slider(
+        "Relevance ↔ diversity",
+        min_value=0.0,
+        max_value=1.0,
+        value=1.0,
+        step=0.1,
+        help="Lower values re-rank a larger candidate pool with MMR so chunks repeat each other less."
+    )
+
+    # Prompt size: retrieved passages are merged/deduplicated, then packed up to this many tokens
+    context_budget = st.slider(
+        "Context token budget",
+        min_value=300,
+        max_value=4000,
+        value=1200,
+        step=100
+    )
+
+    # Semantic answer cache: same mode + same retrieved chunks + a near-identical question
+    use_answer_cache = st.checkbox("Reuse cached answers", value=True,
+                                   help="Follow-up questions that depend on the chat are always answered fresh.")
+
+    st.markdown("---")
+    st.caption("Try a sample question")
+    sample = st.selectbox("Samples", ["(Choose)"] + QUESTION_HINTS)
+    if sample != "(Choose)":
+        st.info(f"Selected sample: {sample}. Type it below or press Enter to send.")
+
+    st.markdown("---")
+
+    if st.button("Clear chat"):
+        st.session_state.messages = []
+        st.session_state.memory.reset()
+        st.session_state.copy_buffer = ""
+        st.rerun()
+    
+    if st.button("Copy last answer"):
+        last_ai = next((m for m in reversed(st.session_state.messages) if m["role"] == "assistant"), None)
+        st.session_state.copy_buffer = last_ai["content"] if last_ai else ""
+
+    if st.session_state.copy_buffer:
+        st.text_area("Copy from here:", st.session_state.copy_buffer, height=120)
+
+    gen = st.session_state.last_generation
+    if gen is not None and gen.total_time is not None:
+        st.caption(f"Last answer: first token {gen.time_to_first_token or 0:.2f}s · total {gen.total_time:.2f}s")
+
+    # Dataset management (add/update files)
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Dataset")
+
+    DATA_DIR = "data"
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    # 1) Upload one or more files into /data
+    uploads = st.sidebar.file_uploader(
+        "Add files (.md, .txt, .pdf)",
+        type=["md", "txt", "pdf"],
+        accept_multiple_files=True
+    )
+
+    if uploads:
+        if st.sidebar.button("Save uploads to dataset"):
+            saved = 0
+            for f in uploads:
+                # Keep original name if possible; fallback to a safe name
+                fname = f.name if f.name else f"upload_{saved}.md"
+                path = os.path.join(DATA_DIR, fname)
+                with open(path, "wb") as out:
+                    out.write(f.read())
+                saved += 1
+
+            # Flag a rebuild and rerun
+            st.session_state["__new_files_added"] = True
+            st.sidebar.success(f"Saved {saved} file(s) to /data")
+            st.rerun()
+
+    # 2) Quick note -> create a new .md file inside /data
+    with st.sidebar.expander("✍️ Quick note (.md)", expanded=False):
+        note_title = st.text_input("Filename (no spaces, ends with .md)", value="new_note.md")
+        note_text = st.text_area("Content (Markdown)")
+
+        if st.button("Save note to dataset"):
+            # basic guard: ensure .md extension
+            if not note_title.lower().endswith(".md"):
+                note_title += ".md"
+            # sanitize filename a little
+            safe_name = note_title.replace(" ", "_").replace("/", "_")
+            path = os.path.join(DATA_DIR, safe_name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(note_text or "")
+            st.session_state["__new_files_added"] = True
+            st.sidebar.success(f"Saved {safe_name} to /data")
+            st.rerun()
+
+# --------------------------
+# Index: served by a background builder; rebuilds never block a rerun
+# --------------------------
+@st.cache_resource
+def _index_builder():
+    # one per process: owns the served index and rebuilds it off the request path
+    return BackgroundIndexBuilder(
+        index_dir="index",
+        data_dir="data",
+        docstore_format="mmap",   # pickle-free, memory-mapped docstore
+    )
+
+@st.cache_resource
+def _data_watcher():
+    # one per process: inotify (or polling) keeps the data signature in memory;
+    # content hashes make touch-only changes a no-op
+    return DataWatcher("data", verify_hashes=True).start()
+
+@st.cache_resource
+def _tracer():
+    # per-stage latency spans; off unless CODEX_METRICS=1 or the sidebar debug toggle is on
+    return Tracer(out_dir="metrics", keep=20)
+
+@st.cache_resource
+def _warm_up():
+    # one per process: loads the index, embedding model and LLM client in the
+    # background, so the first render is not held up by them
+    return WarmUp(builder, lambda: watcher.signature, backend=get_backend()).start()
+
+@st.cache_resource
+def _response_cache():
+    # one per process over a shared SQLite file; other index versions expire once unused
+    return ResponseCache(".cache/responses.sqlite", ttl=7 * 24 * 3600, max_entries=2000)
+
+builder = _index_builder()
+watcher = _data_watcher()
+warm = _warm_up()
+tracer = _tracer()
+# per session: the Tracer is shared by every session, so its own flag is only the default
+st.session_state.setdefault("trace_turns", tracer.enabled)
+trace_turns = st.sidebar.checkbox("Debug: latency breakdown", key="trace_turns")
+turn = tracer.begin(enabled=trace_turns)
+
+# Read the watcher's in-memory signature; rescan synchronously only right after our own writes
+with span("get_data_signature"):
+    if st.session_state.pop("__new_files_added", False):
+        watcher.rescan()
+    data_sig = watcher.signature
+#st.caption(f"Index status: signature {data_sig[:8]}…")
+
+# Rebuild button: queue a forced rebuild; the current index keeps serving meanwhile
+if st.sidebar.button("Rebuild index now"):
+    builder.request_rebuild(data_sig, force=True)
+
+# Never blocks the render: until the warm-up has loaded an index, turns wait for it instead;
+# new data is picked up in the background
+with span("_load_vs"):
+    if warm.done():
+        builder.ensure_loaded(data_sig)
+        builder.request_rebuild(data_sig)
+
+def _render_index_status():
+    status = builder.status()
+    if not warm.done():
+        st.caption("Loading index in the background…")
+    elif status["state"] == "building":
+        st.progress(status["progress"], text=f"Rebuilding index: {status['stage']}…")
+    elif status["state"] == "failed":
+        st.error(f"Index rebuild failed: {status['error']}")
+    else:
+        st.caption(f"Index ready (signature {(status['served_signature'] or '')[:8]})")
+
+with st.sidebar:
+    # refresh the status line on its own while a build runs (st.fragment, Streamlit >= 1.37)
+    _fragment = getattr(st, "fragment", None)
+    if _fragment is not None and builder.status()["state"] == "building":
+        _fragment(run_every=2)(_render_index_status)()
+    else:
+        _render_index_status()
+
+    # Scope questions to chosen sources; applied before the vector search (see rag/filters.py)
+    served_vs = builder.snapshot()[0] if warm.done() else None
+    source_options = metadata_index(served_vs).sources if served_vs is not None else []
+    scoped_sources = st.multiselect(
+        "Limit to sources",
+        source_options,
+        default=[s for s in st.session_state.get("scoped_sources", []) if s in source_options],
+        help="Leave empty to search every document."
+    )
+    st.session_state.scoped_sources = scoped_sources
+
+
+# --------------------------
+# Render chat history
+# --------------------------
+if st.session_state.memory.dropped:
+    st.caption(f"{st.session_state.memory.dropped} earlier messages are kept only as a summary.")
+for msg in st.session_state.messages:
+    with st.chat_message("user" if msg["role"] == "user" else "assistant"):
+        st.markdown(msg["content"])
+
+
+# --------------------------
+# Chat input
+# --------------------------
+placeholder = sample if sample != "(Choose)" else "Ask something like: What kind of engineer are you?"
+user_input = st.chat_input(placeholder=placeholder)
+
+# If user submits a message
+if user_input:
+    # 1) Append user's message to history and render immediately
+    st.session_state.messages.append({"role": "user", "content": user_input})
+    with st.chat_message("user"):
+        st.markdown(user_input)
+
+    # 2) Retrieve context from FAISS for this question
+    #    (over-fetch candidates; the packer trims them to the token budget).
+    #    The lease pins the served index version while it is searched, so a
+    #    rebuild finishing meanwhile cannot evict it from the registry.
+    if not warm.done():
+        with st.spinner("Loading the index…"):
+            warm.wait()
+    builder.ensure_loaded(data_sig)
+    with builder.lease() as (vs, sparse, served_sig):
+        try:
+            with span("retrieve", k=top_k * 2) as sp:
+                _, retrieved_docs = retrieve(vs, user_input, k=top_k * 2, signature=served_sig, sparse=sparse,
+                                             mmr_lambda=mmr_lambda if mmr_lambda < 1.0 else None,
+                                             filters={"source": scoped_sources} if scoped_sources else None)
+                sp.set(chunks=len(retrieved_docs))
+            with span("pack_context", budget=context_budget) as sp:
+                retrieved_context, passages = pack_context(retrieved_docs, token_budget=context_budget)
+                sp.set(passages=len(passages), context_tokens=estimate_tokens(retrieved_context))
+            # the vector retrieve() just computed; keys the answer cache below
+            query_vec = query_embedding(vs, user_input)
+        except Exception as e:
+            with st.chat_message("assistant"):
+                st.error("Failed to retrieve context from the index.")
+                st.exception(e)
+            st.stop()
+
+    # 3) Build prompt text for the model
+    with span("build_llm_prompt") as sp:
+        summary, recent = st.session_state.memory.context(st.session_state.messages)
+        prompt_text = build_llm_prompt(
+            user_q=user_input,
+            retrieved_context=retrieved_context,
+            mode_key=st.session_state.mode,
+            chat_history=recent,
+            max_turns=5,
+            summary=summary
+        )
+        sp.set(prompt_chars=len(prompt_text), history_messages=len(recent))
+
+    # 4) Reuse a cached answer for the same question over the same chunks (not for follow-ups)
+    response_cache = _response_cache()
+    cache_key = dict(mode=st.session_state.mode, context=context_key([d for p in passages for d in p.docs]),
+                     signature=served_sig, model=DEFAULT_MODEL)
+    cacheable = use_answer_cache and not is_context_dependent(user_input, st.session_state.messages[:-1])
+    answer = None
+    if cacheable:
+        with span("response_cache") as sp:
+            answer = response_cache.get(query_vec, **cache_key)
+            sp.set(hit=answer is not None)
+
+    if answer is not None:
+        with st.chat_message("assistant"):
+            st.markdown(answer)
+            st.caption("Cached answer")
+    else:
+        # 5) Stream the Gemini answer into the chat bubble as tokens arrive
+        stats = GenerationStats()
+        with st.chat_message("assistant"):
+            answer = st.write_stream(stream_answer(get_backend(), prompt_text, stats))
+        answer = answer if isinstance(answer, str) else "".join(map(str, answer))
+        st.session_state.last_generation = stats
+        if turn is not None:
+            # cleanup runs interleaved with generation; report it separately
+            turn.add("llm", (stats.total_time - stats.clean_time) * 1000,
+                     ttft_ms=round((stats.time_to_first_token or 0) * 1000, 3), answer_chars=len(answer))
+            turn.add("clean_answer", stats.clean_time * 1000)
+        # errors and missing-key notices are not answers worth keeping
+        if cacheable and answer.strip() and not answer.startswith("⚠️"):
+            response_cache.put(user_input, query_vec, answer=answer, **cache_key)
+    startup_profile.mark("first_answer")
+
+    # 6) Append assistant response to history
+    st.session_state.messages.append({"role": "assistant", "content": answer})
+    traced = tracer.record(turn)
+    if traced is not None:
+        st.session_state.setdefault("traced_turns", deque(maxlen=20)).append(traced)
+
+    # 7) Per-turn retrieved context (collapsible)
+    #with st.expander("Retrieved Context"):
+    #    st.code(retrieved_context)
+else:
+    # reruns without a question are not turns
+    tracer.discard()
+
+
+
+
+# --------------------------
+# Debug: per-stage breakdown of the last turns
+# --------------------------
+if trace_turns and st.session_state.get("traced_turns"):
+    with st.sidebar.expander("Latency breakdown (last turns)", expanded=False):
+        for t in reversed(list(st.session_state.traced_turns)):
+            st.caption(f"{datetime.fromtimestamp(t['ts']).strftime('%H:%M:%S')} · total {t['total_ms']:.0f} ms")
+            st.table(t["spans"])
+
+if trace_turns:
+    with st.sidebar.expander("Index memory", expanded=False):
+        mem = builder.registry.stats()
+        rss = f" · process RSS {mem['rss_bytes'] / 1e6:.0f} MB" if mem["rss_bytes"] else ""
+        mapped = f" + {mem['mapped_bytes'] / 1e6:.1f} MB mapped" if mem["mapped_bytes"] else ""
+        st.caption(f"{len(mem['versions'])}/{mem['max_versions']} versions · {mem['index_bytes'] / 1e6:.1f} MB{mapped}{rss}")
+        st.table(mem["versions"])
+    with st.sidebar.expander("Embedding throughput", expanded=False):
+        from rag.embeddings import embedding_stats
+        st.table(embedding_stats())
+    with st.sidebar.expander("Startup profile", expanded=False):
+        report = startup_profile.report()
+        st.caption(" · ".join(f"{k} {v / 1000:.2f} s" for k, v in report["milestones_ms"].items())
+                   + f" · imports {report['import_ms_total'] / 1000:.2f} s")
+        if warm.error:
+            st.caption(f"Warm-up failed: {warm.error}")
+        st.table(report["imports"])
+
+
+# --------------------------
+# Footer
+# --------------------------
+st.caption(f"Session started: {datetime.now().strftime('%Y-%m-%d')}. Powered by FAISS + HF Inference API.")
+startup_profile.mark("first_render")
@@ -0,0 +1,94 @@
+# ===========================================
+# index_modes.py — recall / latency / size of each index type
+# Usage:
+#   python -m benchmarks.index_modes                       # synthetic vectors
+#   python -m benchmarks.index_modes --index index         # vectors of a built index
+#   python -m benchmarks.index_modes --n 50000 --k 5 --out index_modes.json
+# Recall@k is measured against the exact flat index over the same vectors.
+# ===========================================
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from rag.index_types import INDEX_TYPES, build_faiss_index, index_bytes
+from rag.docstore import DOCSTORE_DIR
+
+
+def synthetic_vectors(n: int, d: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors; closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, d)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, size=n)] + 0.35 * rng.normal(size=(n, d)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def make_queries(vectors: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), size=n_queries)]
+    q = picks + 0.1 * rng.normal(size=picks.shape).astype(np.float32)
+    return np.ascontiguousarray(q / np.linalg.norm(q, axis=1, keepdims=True), dtype=np.float32)
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+def run(vectors: np.ndarray, k: int, n_queries: int) -> dict:
+    queries = make_queries(vectors, n_queries)
+    exact, _ = build_faiss_index(vectors, "flat")
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in INDEX_TYPES:
+        t0 = time.perf_counter()
+        index, info = build_faiss_index(vectors, index_type)
+        build_s = time.perf_counter() - t0
+
+        # one query at a time, like a chat turn
+        lat = []
+        found = []
+        for q in queries:
+            t0 = time.perf_counter()
+            _, idx = index.search(q[None, :], k)
+            lat.append(time.perf_counter() - t0)
+            found.append(idx[0])
+        lat_ms = np.asarray(lat) * 1000
+        results.append({
+            **info,
+            f"recall@{k}": round(_recall(truth, np.asarray(found)), 4),
+            "latency_ms_p50": round(float(np.percentile(lat_ms, 50)), 4),
+            "latency_ms_p95": round(float(np.percentile(lat_ms, 95)), 4),
+            "index_bytes": index_bytes(index),
+            "build_s": round(build_s, 3),
+        })
+    return {"n": int(len(vectors)), "dim": int(vectors.shape[1]), "k": k, "queries": n_queries, "results": results}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Recall@k, latency and size of each FAISS index type.")
+    ap.add_argument("--index", help="index dir whose docstore/vectors.npy to benchmark")
+    ap.add_argument("--n", type=int, default=20000, help="synthetic vector count")
+    ap.add_argument("--dim", type=int, default=384, help="synthetic vector dim (MiniLM = 384)")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--out", help="also write the JSON report here")
+    args = ap.parse_args(argv)
+
+    if args.index:
+        vectors = np.load(os.path.join(args.index, DOCSTORE_DIR, "vectors.npy")).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.n, args.dim)
+
+    report = run(vectors, args.k, args.queries)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# ===========================================
+# run_benchmarks.py — ingestion, retrieval and end-to-end turn latency
+# Fully offline: synthetic corpora, HashingEmbeddings instead of MiniLM,
+# FakeStreamingBackend instead of Gemini.
+# Usage:
+#   python -m benchmarks.run_benchmarks                       # scales 1,10
+#   python -m benchmarks.run_benchmarks --scales 1,10,100,1000 --out bench.json
+# Diff two JSON reports to compare versions.
+# ===========================================
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, List
+
+from rag.build_index import _load_docs, build_or_load_index, get_data_signature
+from rag.chunking import chunk_extracted
+from rag.context import pack_context
+from rag.embeddings import HashingEmbeddings
+from rag.llm import FakeStreamingBackend, stream_answer
+from rag.prompts import MODES, QUESTION_HINTS, build_llm_prompt
+from rag.retriever import clear_cache, metadata_index, retrieve
+from rag.sparse_index import load_sparse_index
+
+from benchmarks.synthetic import generate_corpus
+
+QUERIES = QUESTION_HINTS + [
+    "Who is Gagashe?",
+    "Tell me about Izimpisi",
+    "What happened with the COMP315 quiz game?",
+    "What IoT projects did you build?",
+    "How did the honours thesis go?",
+    "Who are the Ndishi Boys?",
+]
+K_VALUES = (3, 5, 10)
+# fake LLM: ~60 tokens, no delay, so the turn number isolates our own overhead
+FAKE_ANSWER = ["I ", "built ", "Izimpisi ", "(Doc 1) ", "with ", "my ", "team. "] * 9
+
+
+def _percentiles(samples: List[float]) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    def pct(p):
+        return round(ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))], 4)
+    return {"p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99), "mean_ms": round(statistics.fmean(ms), 4), "n": len(ms)}
+
+def _time(fn: Callable, repeat: int = 1):
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return samples, result
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_scale(scale: int, workdir: str, repeats: int, docstore_format: str) -> dict:
+    data_dir = os.path.join(workdir, f"data_{scale}x")
+    index_dir = os.path.join(workdir, f"index_{scale}x")
+    cache_dir = os.path.join(workdir, f"cache_{scale}x")
+    corpus = generate_corpus(data_dir, scale=scale)
+    embeddings = HashingEmbeddings()
+    out = {"corpus": corpus}
+
+    # -- change detection
+    samples, sig = _time(lambda: get_data_signature(data_dir), repeat=max(3, repeats))
+    out["get_data_signature"] = _percentiles(samples)
+
+    # -- ingestion stages
+    samples, docs = _time(lambda: _load_docs(data_dir))
+    out["load_docs"] = {"seconds": round(samples[0], 4), "docs": len(docs),
+                        "docs_per_s": round(len(docs) / samples[0], 2),
+                        "mb_per_s": round(corpus["bytes"] / 1e6 / samples[0], 3)}
+
+    samples, chunks = _time(lambda: [c for d in docs for c in chunk_extracted(d.page_content, d.metadata)[0]])
+    out["split"] = {"seconds": round(samples[0], 4), "chunks": len(chunks),
+                    "chunks_per_s": round(len(chunks) / samples[0], 2)}
+
+    texts = [text for text, _ in chunks]
+    samples, _ = _time(lambda: embeddings.embed_documents(texts))
+    out["embed"] = {"seconds": round(samples[0], 4), "chunks_per_s": round(len(texts) / samples[0], 2),
+                    "embedder": embeddings.model_name}
+    del docs, chunks, texts
+
+    # -- index build / load
+    def _build(force=False):
+        return build_or_load_index(index_dir=index_dir, data_dir=data_dir, data_signature=sig,
+                                   force_rebuild=force, cache_dir=cache_dir,
+                                   docstore_format=docstore_format, embeddings=embeddings)
+
+    samples, vs = _time(_build)
+    out["build_cold"] = {"seconds": round(samples[0], 4), "vectors": int(vs.index.ntotal)}
+    samples, _ = _time(lambda: _build(force=True))
+    out["build_forced_cached_embeddings"] = {"seconds": round(samples[0], 4)}
+    samples, vs = _time(_build, repeat=max(3, repeats))
+    out["load_warm"] = _percentiles(samples)
+    sparse = load_sparse_index(index_dir)
+
+    # -- retrieval (uncached: no signature passed, query-embedding cache cleared)
+    out["retrieve"] = {}
+    for hybrid in (False, True):
+        for k in K_VALUES:
+            samples = []
+            for _ in range(repeats):
+                for q in QUERIES:
+                    clear_cache()
+                    t0 = time.perf_counter()
+                    retrieve(vs, q, k=k, sparse=sparse if hybrid else None)
+                    samples.append(time.perf_counter() - t0)
+            out["retrieve"][f"{'hybrid' if hybrid else 'dense'}_k{k}"] = _percentiles(samples)
+
+    # -- filtered retrieval: the largest source, given as a scalar (same as a one-element list)
+    meta = metadata_index(vs)
+    source = max(meta.rows_by_source().items(), key=lambda kv: kv[1])[0]
+    scalar_rows, list_rows = meta.rows({"source": source}), meta.rows({"source": [source]})
+    if not len(scalar_rows) or list(scalar_rows) != list(list_rows):
+        raise RuntimeError(f"scalar source filter {source!r} does not match like a one-element list")
+    samples = []
+    for _ in range(repeats):
+        for q in QUERIES:
+            clear_cache()
+            t0 = time.perf_counter()
+            _, docs = retrieve(vs, q, k=5, sparse=sparse, filters={"source": source})
+            samples.append(time.perf_counter() - t0)
+            if not docs or any(d.metadata.get("source") != source for d in docs):
+                raise RuntimeError(f"filtered retrieval for {q!r} left source {source!r}")
+    out["retrieve"]["hybrid_k5_one_source"] = {**_percentiles(samples), "source_vectors": int(meta.rows_by_source()[source])}
+
+    # -- prompt assembly
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": QUERIES[i % len(QUERIES)] * 3}
+               for i in range(12)]
+    context, _ = retrieve(vs, QUERIES[0], k=5)
+    mode = next(iter(MODES))
+    samples, prompt = _time(lambda: build_llm_prompt(QUERIES[0], context, mode, history), repeat=200)
+    out["build_llm_prompt"] = {**_percentiles(samples), "prompt_chars": len(prompt)}
+
+    # -- end-to-end turn with a stub LLM
+    backend = FakeStreamingBackend(FAKE_ANSWER)
+    samples = []
+    for _ in range(repeats):
+        for q in QUERIES:
+            clear_cache()
+            t0 = time.perf_counter()
+            _, docs = retrieve(vs, q, k=10, sparse=sparse)
+            ctx, _ = pack_context(docs, token_budget=1200)
+            p = build_llm_prompt(q, ctx, mode, history)
+            "".join(stream_answer(backend, p))
+            samples.append(time.perf_counter() - t0)
+    out["turn"] = _percentiles(samples)
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline ingestion / retrieval / turn-latency benchmarks.")
+    ap.add_argument("--scales", default="1,10", help="comma-separated corpus multipliers of data/ (e.g. 1,10,100,1000)")
+    ap.add_argument("--repeats", type=int, default=3, help="repetitions of each latency loop")
+    ap.add_argument("--docstore-format", default="mmap", choices=["pickle", "mmap"])
+    ap.add_argument("--workdir", help="where corpora/indexes go (default: a temp dir, removed afterwards)")
+    ap.add_argument("--out", help="also write the JSON report here")
+    args = ap.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="codex-bench-")
+    report = {
+        "version": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "docstore_format": args.docstore_format,
+        "scales": {},
+    }
+    try:
+        for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+            report["scales"][f"{scale}x"] = bench_scale(scale, workdir, args.repeats, args.docstore_format)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# ===========================================
+# synthetic.py — deterministic corpora shaped like data/
+# Markdown notes (headings, names, projects) plus multi-page PDFs,
+# generated without any PDF library.
+# ===========================================
+
+import os
+import random
+from typing import List
+
+# 1x ~= the real data/ folder: a couple dozen notes and one short CV-style PDF
+NOTES_PER_SCALE = 18
+PDFS_PER_SCALE = 1
+PDF_PAGES = 3
+# every Nth PDF is a long one, to exercise page-level parallelism
+LONG_PDF_EVERY = 10
+LONG_PDF_PAGES = 120
+
+_PEOPLE = ["Samukelo", "Gagashe", "Ndishi", "Zolile", "Mhlongo", "Yuvika", "Thando", "Lerato", "Sipho", "Ayanda"]
+_PROJECTS = ["Izimpisi", "RALLSMOH", "Personal Codex", "COMP315 quiz game", "IoT greenhouse", "honours thesis"]
+_TOPICS = ["machine learning", "software engineering", "data pipelines", "IoT sensors", "retrieval", "debugging",
+           "team culture", "tutoring", "graduation", "campus life", "C++", "Python", "FAISS", "Streamlit"]
+_VERBS = ["built", "debugged", "designed", "presented", "tested", "refactored", "deployed", "documented", "led"]
+_FILLER = ["during my honours year", "with the team", "under pressure", "for a module", "late at night",
+           "after a long week", "with a lot of coffee", "before the deadline", "for the demo"]
+
+
+def _sentence(rng: random.Random) -> str:
+    return (f"{rng.choice(_PEOPLE)} and I {rng.choice(_VERBS)} {rng.choice(_PROJECTS)} "
+            f"using {rng.choice(_TOPICS)} {rng.choice(_FILLER)}.")
+
+def _paragraph(rng: random.Random, n_sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(n_sentences))
+
+def markdown_note(rng: random.Random) -> str:
+    lines = [f"# {rng.choice(_PROJECTS)} notes", ""]
+    for _ in range(rng.randint(2, 5)):
+        lines += [f"## {rng.choice(_TOPICS).title()}", "", _paragraph(rng, rng.randint(3, 9)), ""]
+        if rng.random() < 0.4:
+            lines += [f"### {rng.choice(_PEOPLE)}", ""]
+            lines += [f"- {_sentence(rng)}" for _ in range(rng.randint(2, 5))] + [""]
+    return "\n".join(lines)
+
+
+# -------- minimal PDF writer (text-only, Helvetica) --------
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(text: str, width: int = 90) -> List[str]:
+    out, line = [], ""
+    for word in text.split():
+        if len(line) + len(word) + 1 > width:
+            out.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        out.append(line)
+    return out
+
+def write_pdf(path: str, pages: List[str]) -> None:
+    """Write a valid, text-extractable PDF with one page per string."""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    next_id = 4
+    for text in pages:
+        lines = _wrap(text)[:60]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"] + [f"({_pdf_escape(l)}) '" for l in lines] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n"
+    xref = len(out)
+    n = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % n
+    for obj_id in range(1, n):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (n, xref)
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+
+def generate_corpus(out_dir: str, scale: int = 1, seed: int = 0) -> dict:
+    """Write a corpus `scale` times the size of data/ into out_dir; returns a small summary."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    total_bytes = 0
+    for i in range(NOTES_PER_SCALE * scale):
+        path = os.path.join(out_dir, f"note_{i:06d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(markdown_note(rng))
+        total_bytes += os.path.getsize(path)
+    pdf_pages = 0
+    for i in range(PDFS_PER_SCALE * scale):
+        n_pages = LONG_PDF_PAGES if (i + 1) % LONG_PDF_EVERY == 0 else PDF_PAGES
+        path = os.path.join(out_dir, f"cv_{i:05d}.pdf")
+        write_pdf(path, [_paragraph(rng, 12) for _ in range(n_pages)])
+        total_bytes += os.path.getsize(path)
+        pdf_pages += n_pages
+    return {
+        "scale": scale,
+        "notes": NOTES_PER_SCALE * scale,
+        "pdfs": PDFS_PER_SCALE * scale,
+        "pdf_pages": pdf_pages,
+        "bytes": total_bytes,
+    }
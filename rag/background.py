@@ -0,0 +1,231 @@
+# ===========================================
+# background.py — non-blocking index rebuilds with an atomic swap
+# Rebuilds run in a worker thread against a copy of the index directory;
+# queries keep hitting the previous index until the finished copy is
+# swapped into place.
+# ===========================================
+
+import os
+import time
+import uuid
+import ctypes
+import shutil
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+from rag.build_index import build_or_load_index, index_is_stale, _manifest_paths, _read_manifest
+from rag.registry import IndexRegistry
+from rag.sparse_index import load_sparse_index
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+
+def _exchange_dirs(a: str, b: str) -> bool:
+    """Atomically swap two paths with renameat2(RENAME_EXCHANGE). False if unsupported."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        return False
+    rc = renameat2(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE)
+    return rc == 0
+
+def swap_index_dir(new_dir: str, index_dir: str) -> None:
+    """Move new_dir into index_dir's place; the previous contents are deleted."""
+    if not os.path.exists(index_dir):
+        os.replace(new_dir, index_dir)
+        return
+    if _exchange_dirs(new_dir, index_dir):
+        # new_dir now holds the old index
+        shutil.rmtree(new_dir, ignore_errors=True)
+        return
+    # fallback: two renames; index_dir is missing only between them
+    old = f"{index_dir}.old-{uuid.uuid4().hex[:8]}"
+    os.replace(index_dir, old)
+    os.replace(new_dir, index_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+@dataclass
+class BuildStatus:
+    state: str = "idle"            # idle | building | ready | failed
+    stage: str = ""
+    progress: float = 0.0
+    target_signature: Optional[str] = None
+    served_signature: Optional[str] = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class BackgroundIndexBuilder:
+    """
+    Owns the index that is currently being served and rebuilds it off the request path.
+    One per process (e.g. via st.cache_resource). Loaded versions live in `registry`,
+    so replaced ones are freed once no turn holds them. Extra build_or_load_index
+    kwargs (docstore_format, index_type, ...) are passed through.
+    """
+
+    def __init__(self, index_dir: str = "index", data_dir: str = "data", registry: IndexRegistry = None,
+                 **build_kwargs):
+        self.index_dir = index_dir
+        self.data_dir = data_dir
+        self.build_kwargs = build_kwargs
+        self.registry = registry or IndexRegistry(max_versions=2)
+        self._lock = threading.Lock()          # guards serving state; never held during a build
+        self._load_lock = threading.Lock()     # one first load at a time
+        self._served: Optional[str] = None        # signature of the version being served
+        self._status = BuildStatus()
+        self._worker: Optional[threading.Thread] = None
+        self._pending: Optional[Tuple[str, bool]] = None
+
+    # -------- serving --------
+
+    def snapshot(self) -> Tuple:
+        """(vs, sparse, signature) of the index being served, or (None, None, None)."""
+        with self._lock:
+            sig = self._served
+        pair = self.registry.get(sig) if sig is not None else None
+        return (*pair, sig) if pair is not None else (None, None, None)
+
+    @contextmanager
+    def lease(self):
+        """Like snapshot(), but the version stays loaded until the block exits (e.g. one chat turn)."""
+        with self._lock:
+            sig = self._served
+        with self.registry.lease(sig) as pair:
+            yield (*pair, sig) if pair is not None else (None, None, None)
+
+    def status(self) -> dict:
+        with self._lock:
+            return asdict(self._status)
+
+    def ensure_loaded(self, signature: str) -> Tuple:
+        """
+        Make sure something is being served. Loads whatever index is on disk (even one
+        for older data, which is then rebuilt in the background); blocks only when nothing
+        on disk is loadable as is, and then builds in a copy like a background rebuild.
+        status() stays readable throughout.
+        """
+        with self._load_lock:
+            with self._lock:
+                served_sig = self._served
+            if served_sig is None:
+                served_sig = self._load_initial(signature)
+        if served_sig != signature:
+            self.request_rebuild(signature)
+        return self.snapshot()
+
+    def _load_initial(self, signature: str) -> str:
+        # the first load counts as the active worker, so rebuilds requested meanwhile queue behind it
+        while True:
+            with self._lock:
+                worker = self._worker
+                if worker is None or not worker.is_alive():
+                    self._worker = threading.current_thread()
+                    break
+            # a background build is already running: wait for it instead of racing it
+            worker.join()
+            with self._lock:
+                if self._served is not None:
+                    return self._served
+        try:
+            on_disk = _read_manifest(self.index_dir).get("data_signature")
+            index_path, _ = _manifest_paths(self.index_dir)
+            kw = self.build_kwargs
+            if on_disk and os.path.exists(index_path) and not index_is_stale(
+                    self.index_dir, on_disk, kw.get("index_type", "flat"), kw.get("shard")):
+                vs = build_or_load_index(index_dir=self.index_dir, data_dir=self.data_dir,
+                                         data_signature=on_disk, **kw)
+                with self._lock:
+                    self._serve(on_disk, vs, load_sparse_index(self.index_dir))
+                return on_disk
+            # nothing usable on disk (missing, older chunker, other index type): build it
+            with self._lock:
+                self._status = BuildStatus(state="building", stage="queued", target_signature=signature,
+                                           started_at=time.time())
+            self._build(signature, force=False)
+            return signature
+        except Exception as e:
+            self._failed(e)
+            raise
+        finally:
+            self._finish()
+
+    # -------- rebuilding --------
+
+    def request_rebuild(self, signature: str, force: bool = False) -> None:
+        """Queue a rebuild for `signature`; no-op if it is already served or being built."""
+        with self._lock:
+            busy = self._worker is not None and self._worker.is_alive()
+            if not force:
+                if busy and self._status.target_signature == signature:
+                    return
+                if not busy and self._served == signature:
+                    return
+            if busy:
+                # latest request wins; picked up when the current build finishes
+                self._pending = (signature, force)
+                return
+            self._start(signature, force)
+
+    def _start(self, signature: str, force: bool) -> None:
+        self._status = BuildStatus(state="building", stage="queued", target_signature=signature,
+                                   served_signature=self._status.served_signature, started_at=time.time())
+        self._worker = threading.Thread(target=self._run, args=(signature, force), name="index-builder", daemon=True)
+        self._worker.start()
+
+    def _progress(self, stage: str, fraction: float) -> None:
+        with self._lock:
+            self._status.stage = stage
+            self._status.progress = fraction
+
+    def _serve(self, signature: str, vs, sparse) -> None:
+        # caller holds self._lock; the previous version stays loaded only while a turn still leases it
+        self.registry.put(signature, vs, sparse)
+        self._served = signature
+        self._status.state = "ready"
+        self._status.served_signature = signature
+        self._status.finished_at = time.time()
+
+    def _failed(self, e: Exception) -> None:
+        with self._lock:
+            self._status.state = "failed"
+            self._status.error = f"{type(e).__name__}: {e}"
+            self._status.finished_at = time.time()
+
+    def _build(self, signature: str, force: bool) -> None:
+        """Build `signature` in a copy of the index dir, then swap it in and serve it."""
+        tmp = f"{self.index_dir}.build-{uuid.uuid4().hex[:8]}"
+        try:
+            # start from a copy so the build can stay incremental
+            if os.path.exists(self.index_dir):
+                shutil.copytree(self.index_dir, tmp)
+            vs = build_or_load_index(index_dir=tmp, data_dir=self.data_dir, data_signature=signature,
+                                     force_rebuild=force, progress=self._progress, **self.build_kwargs)
+            sparse = load_sparse_index(tmp)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        with self._lock:
+            swap_index_dir(tmp, self.index_dir)
+            self._serve(signature, vs, sparse)
+
+    def _run(self, signature: str, force: bool) -> None:
+        try:
+            self._build(signature, force)
+        except Exception as e:
+            self._failed(e)
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        """Hand over to the rebuild queued while the current build ran, if any."""
+        with self._lock:
+            self._worker = None
+            pending, self._pending = self._pending, None
+            if pending is not None and (pending[1] or pending[0] != self._status.served_signature):
+                self._start(*pending)
@@ -1,162 +1,464 @@
-# ===========================================
-# build_index.py — Auto-rebuilding FAISS index
-# Resilient loaders + rebuilds when /data changes.
-# ===========================================
-
-import os
-import glob
-import json
-import hashlib
-from typing import Tuple, List
-
-# Try to import LangChain loaders; fall back if unavailable.
-try:
-    from langchain_community.document_loaders import PyPDFLoader, TextLoader
-    _HAS_LC_LOADERS = True
-except Exception:
-    _HAS_LC_LOADERS = False
-
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-
-# -------- utilities for data fingerprinting --------
-
-def _list_data_files(data_dir: str) -> List[str]:
-    patterns = ("*.pdf", "*.md", "*.txt")
-    files = []
-    for pat in patterns:
-        files.extend(glob.glob(os.path.join(data_dir, pat)))
-    return sorted(files)
-
-def get_data_signature(data_dir: str = "data") -> str:
-    os.makedirs(data_dir, exist_ok=True)
-    files = _list_data_files(data_dir)
-    meta = []
-    for f in files:
-        try:
-            st = os.stat(f)
-            meta.append({
-                "path": os.path.relpath(f, data_dir).replace("\\", "/"),
-                "size": st.st_size,
-                "mtime": int(st.st_mtime),
-            })
-        except FileNotFoundError:
-            continue
-    payload = json.dumps(meta, sort_keys=True, ensure_ascii=False)
-    return hashlib.md5(payload.encode("utf-8")).hexdigest()
-
-def _manifest_paths(index_dir: str) -> Tuple[str, str]:
-    return os.path.join(index_dir, "index.faiss"), os.path.join(index_dir, "manifest.json")
-
-def _read_manifest(index_dir: str) -> dict:
-    _, manifest_path = _manifest_paths(index_dir)
-    if not os.path.exists(manifest_path):
-        return {}
-    try:
-        with open(manifest_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def _write_manifest(index_dir: str, data_signature: str, files: List[str]) -> None:
-    os.makedirs(index_dir, exist_ok=True)
-    _, manifest_path = _manifest_paths(index_dir)
-    payload = {
-        "data_signature": data_signature,
-        "files": [os.path.basename(f) for f in files],
-    }
-    with open(manifest_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
-
-# -------- resilient document loading --------
-
-def _load_docs_via_langchain(paths: List[str]):
-    docs = []
-    for path in paths:
-        lower = path.lower()
-        if lower.endswith(".pdf"):
-            try:
-                docs.extend(PyPDFLoader(path).load())
-            except Exception:
-                # ignore unreadable PDFs
-                pass
-        elif lower.endswith((".md", ".txt")):
-            try:
-                docs.extend(TextLoader(path, encoding="utf-8").load())
-            except Exception:
-                pass
-    return docs
-
-def _load_docs_via_fallback(paths: List[str]):
-    """Fallback loader that does not rely on langchain loaders."""
-    from langchain.schema import Document
-    docs = []
-    for path in paths:
-        lower = path.lower()
-        if lower.endswith(".pdf"):
-            # use pypdf to read text
-            try:
-                from pypdf import PdfReader
-                reader = PdfReader(path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-                if text.strip():
-                    docs.append(Document(page_content=text, metadata={"source": os.path.basename(path)}))
-            except Exception:
-                pass
-        elif lower.endswith((".md", ".txt")):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                if text.strip():
-                    docs.append(Document(page_content=text, metadata={"source": os.path.basename(path)}))
-            except Exception:
-                pass
-    return docs
-
-def _load_docs(data_dir: str = "data"):
-    paths = _list_data_files(data_dir)
-    if _HAS_LC_LOADERS:
-        docs = _load_docs_via_langchain(paths)
-        # If LC loaders returned nothing (unlikely), try fallback
-        if docs:
-            return docs
-    return _load_docs_via_fallback(paths)
-
-# -------- main build / load --------
-
-def build_or_load_index(
-    index_dir: str = "index",
-    data_dir: str = "data",
-    data_signature: str = None,
-    force_rebuild: bool = False,
-):
-    os.makedirs(index_dir, exist_ok=True)
-    index_path, _ = _manifest_paths(index_dir)
-
-    if data_signature is None:
-        data_signature = get_data_signature(data_dir)
-
-    manifest = _read_manifest(index_dir)
-    manifest_sig = manifest.get("data_signature")
-
-    needs_rebuild = force_rebuild or (manifest_sig != data_signature) or (not os.path.exists(index_path))
-
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    if not needs_rebuild:
-        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
-
-    # Build fresh
-    docs = _load_docs(data_dir)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=120)
-    chunks = splitter.split_documents(docs)
-
-    vs = FAISS.from_documents(chunks, embeddings)
-    vs.save_local(index_dir)
-    _write_manifest(index_dir, data_signature, _list_data_files(data_dir))
-    return vs
-
-
+# ===========================================
+# build_index.py — Auto-rebuilding FAISS index
+# Resilient loaders + rebuilds when /data changes.
+# ===========================================
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Tuple, List, Dict
+
+from rag.chunking import CHUNKER_VERSION
+from rag.dedup import DEDUP_VERSION, Deduplicator, chunk_source, dedup_report
+from rag.sparse_index import BM25Index
+from rag.docstore import docstore_exists, load_mmap_store, load_mutable_store, write_docstore
+from rag.filters import MetadataIndex
+from rag.index_types import INDEX_TYPES, build_faiss_index, configure_search
+
+# langchain, the embedding model and the file loaders are imported where they are
+# first needed: the watcher and the app import this module long before any build
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# -------- utilities for data fingerprinting --------
+
+DATA_EXTENSIONS = (".pdf", ".md", ".txt")
+
+def _is_data_file(rel: str) -> bool:
+    """Indexed files: known extensions, anywhere under data/, skipping hidden files/dirs."""
+    parts = rel.replace("\\", "/").split("/")
+    return rel.lower().endswith(DATA_EXTENSIONS) and not any(p.startswith(".") for p in parts)
+
+# (shard number, shard count): a stable slice of a corpus's files
+Shard = Tuple[int, int]
+
+def in_shard(rel: str, shard: Optional[Shard]) -> bool:
+    """Files are spread over shards by a hash of their path, so an edit touches one shard only."""
+    if shard is None:
+        return True
+    number, count = shard
+    return int(hashlib.md5(rel.encode("utf-8")).hexdigest()[:8], 16) % count == number
+
+def _list_data_files(data_dir: str, shard: Optional[Shard] = None) -> List[str]:
+    files = []
+    for root, dirs, names in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            path = os.path.join(root, name)
+            rel = _rel_path(path, data_dir)
+            if _is_data_file(rel) and in_shard(rel, shard):
+                files.append(path)
+    return sorted(files)
+
+def _stat_entry(path: str, data_dir: str) -> dict:
+    st = os.stat(path)
+    return {"path": _rel_path(path, data_dir), "size": st.st_size, "mtime": int(st.st_mtime)}
+
+def signature_from_entries(entries) -> str:
+    """md5 over per-file entries ({"path", "size", "mtime"} or {"path", "size", "sha256"})."""
+    meta = sorted(entries, key=lambda e: e["path"])
+    payload = json.dumps(meta, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def get_data_signature(data_dir: str = "data", shard: Optional[Shard] = None) -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    meta = []
+    for f in _list_data_files(data_dir, shard):
+        try:
+            meta.append(_stat_entry(f, data_dir))
+        except FileNotFoundError:
+            continue
+    return signature_from_entries(meta)
+
+def _rel_path(path: str, data_dir: str) -> str:
+    return os.path.relpath(path, data_dir).replace("\\", "/")
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def hash_files(paths: List[str], workers: int = None) -> Dict[str, str]:
+    """sha256 of many files in parallel (hashlib releases the GIL on large reads)."""
+    if len(paths) < 2:
+        return {p: _file_hash(p) for p in paths}
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        return dict(zip(paths, pool.map(_file_hash, paths)))
+
+def _manifest_paths(index_dir: str) -> Tuple[str, str]:
+    return os.path.join(index_dir, "index.faiss"), os.path.join(index_dir, "manifest.json")
+
+def _read_manifest(index_dir: str) -> dict:
+    _, manifest_path = _manifest_paths(index_dir)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _write_manifest(index_dir: str, data_signature: str, files: List[str], sources: Dict[str, dict] = None, **extra) -> None:
+    os.makedirs(index_dir, exist_ok=True)
+    _, manifest_path = _manifest_paths(index_dir)
+    payload = {
+        "data_signature": data_signature,
+        "files": [os.path.basename(f) for f in files],
+        # per-file content hash + the vector ids its chunks were stored under
+        "sources": sources or {},
+        **extra,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+# -------- streaming document loading --------
+
+# chunks handed to the embedder per call while building
+EMBED_BATCH = 256
+
+def _iter_docs(paths: List[str], data_dir: str, workers: int = None) -> Iterator["Document"]:
+    """Yield one Document per text file / PDF page; extraction runs in a process pool."""
+    from langchain_core.documents import Document
+    from rag.loaders import iter_extracted
+    pairs = [(p, _rel_path(p, data_dir)) for p in paths]
+    for text, metadata in iter_extracted(pairs, workers=workers):
+        yield Document(page_content=text, metadata=metadata)
+
+def _load_docs(data_dir: str = "data", workers: int = None) -> List["Document"]:
+    return list(_iter_docs(_list_data_files(data_dir), data_dir, workers=workers))
+
+# -------- chunking + incremental updates --------
+
+def _iter_file_chunks(paths: List[str], data_dir: str, workers: int = None) -> Iterator[Tuple[str, List["Document"]]]:
+    """
+    Stream (source, chunks) per file; a file's chunks arrive contiguously and in order.
+    Extraction and structure-aware chunking both run in the loader's worker pool.
+    """
+    from langchain_core.documents import Document
+    from rag.loaders import iter_chunks
+    pairs = [(p, _rel_path(p, data_dir)) for p in paths]
+    chunks = (Document(page_content=text, metadata=meta) for text, meta in iter_chunks(pairs, workers=workers))
+    for rel, file_chunks in groupby(chunks, key=lambda d: d.metadata["source"]):
+        yield rel, list(file_chunks)
+
+def _chunk_ids(rel: str, n: int) -> List[str]:
+    return [f"{rel}::{i}" for i in range(n)]
+
+def _diff_sources(old: Dict[str, dict], current: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """Return (files to (re)embed, files whose vectors must be dropped)."""
+    to_embed = {rel for rel, digest in current.items() if old.get(rel, {}).get("sha256") != digest}
+    changed = to_embed | {rel for rel in old if rel not in current}
+    # files (or chunks) dropped as copies of a changed file must be re-checked
+    while True:
+        dependents = {rel for rel, entry in old.items()
+                      if rel in current and rel not in to_embed and changed & _duplicate_refs(entry)}
+        if not dependents:
+            break
+        to_embed |= dependents
+        changed |= dependents
+    to_drop = [rel for rel in old if rel not in current or rel in to_embed]
+    return sorted(to_embed), sorted(to_drop)
+
+def _duplicate_refs(entry: dict) -> set:
+    """Sources an entry's dropped document / chunks were judged duplicates of."""
+    refs = {chunk_source(d["duplicate_of"]) for d in entry.get("dropped_chunks", [])}
+    if entry.get("duplicate"):
+        refs.add(entry["duplicate"]["duplicate_of"])
+    return refs
+
+# progress(stage, fraction) callback used by background builds
+Progress = Callable[[str, float], None]
+
+def _no_progress(stage: str, fraction: float) -> None:
+    pass
+
+def _embed_files(vs, paths: List[str], data_dir: str, embeddings, current: Dict[str, str], sparse: BM25Index,
+                 progress: Progress = _no_progress, dedup: Deduplicator = None):
+    """
+    Stream `paths` through load -> split -> dedup -> embed, adding to `vs` (and `sparse`) in batches.
+    Creates the store on the first batch when `vs` is None (an empty one if nothing was
+    added, e.g. an empty corpus or shard). Returns (vs, sources).
+    Duplicate files and chunks are skipped and recorded on their source entry.
+    """
+    from langchain_community.vectorstores import FAISS
+    dedup = dedup or Deduplicator()
+    sources = {_rel_path(p, data_dir): {"sha256": current[_rel_path(p, data_dir)], "ids": []} for p in paths}
+    batch, batch_ids = [], []
+
+    def _flush(vs):
+        if not batch:
+            return vs
+        if vs is None:
+            vs = FAISS.from_documents(batch, embeddings, ids=batch_ids)
+        else:
+            vs.add_documents(batch, ids=batch_ids)
+        batch.clear()
+        batch_ids.clear()
+        return vs
+
+    for done, (rel, chunks) in enumerate(_iter_file_chunks(paths, data_dir), start=1):
+        # load+split+embed is the bulk of a build: map it onto 5%..90%
+        progress("embedding", 0.05 + 0.85 * done / max(1, len(paths)))
+        ids = _chunk_ids(rel, len(chunks))
+        kept, duplicate, dropped = dedup.filter_file(rel, [(i, c.page_content) for i, c in zip(ids, chunks)])
+        if duplicate:
+            sources[rel]["duplicate"] = duplicate
+        if dropped:
+            sources[rel]["dropped_chunks"] = dropped
+        # ids stay positional, so a kept chunk keeps its id whatever was dropped around it
+        keep = {chunk_id for chunk_id, _ in kept}
+        pairs = [(i, c) for i, c in zip(ids, chunks) if i in keep]
+        sources[rel]["ids"] = [i for i, _ in pairs]
+        batch.extend(c for _, c in pairs)
+        batch_ids.extend(i for i, _ in pairs)
+        for chunk_id, chunk in pairs:
+            sparse.add(chunk_id, chunk.page_content)
+        if len(batch) >= EMBED_BATCH:
+            vs = _flush(vs)
+    vs = _flush(vs)
+    return (vs if vs is not None else _empty_store(embeddings)), sources
+
+def _empty_store(embeddings):
+    """A store with no vectors yet, in the same shape FAISS.from_documents builds."""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    dim = len(embeddings.embed_query("dimension probe"))
+    return FAISS(embeddings, faiss.IndexFlatL2(dim), InMemoryDocstore({}), {})
+
+def _apply_changes(vs, data_dir: str, embeddings, sparse: BM25Index, old: Dict[str, dict], current: Dict[str, str],
+                   progress: Progress = _no_progress, dedup: Optional[Deduplicator] = None):
+    """
+    Update `vs` in place so it matches `current`; returns (new sources map, dedup state).
+    `dedup` is the state saved by the previous build; without it (or when it does not
+    match the manifest) it is rebuilt from the docstore once.
+    """
+    to_embed, to_drop = _diff_sources(old, current)
+    sources = {rel: entry for rel, entry in old.items() if rel in current and rel not in to_embed}
+
+    stale_ids = [i for rel in to_drop for i in old[rel].get("ids", [])]
+    if stale_ids:
+        vs.delete(stale_ids)
+        sparse.remove_many(stale_ids)
+
+    # files already in the index count as the first copy of anything re-added
+    if dedup is not None and set(dedup.chunks.keys()) == {i for e in old.values() for i in e.get("ids", [])}:
+        dedup.remove_sources(to_drop)
+    else:
+        dedup = Deduplicator()
+        for rel in sorted(sources):
+            docs = [(i, vs.docstore.search(i)) for i in sources[rel].get("ids", [])]
+            dedup.seed(rel, [(i, d.page_content) for i, d in docs if hasattr(d, "page_content")])
+
+    paths = [os.path.join(data_dir, rel) for rel in to_embed]
+    _, added = _embed_files(vs, paths, data_dir, embeddings, current, sparse, progress, dedup)
+    sources.update(added)
+    return sources, dedup
+
+def _sparse_from_store(vs) -> BM25Index:
+    """Rebuild the BM25 index from an existing docstore (e.g. index built before bm25.json existed)."""
+    sparse = BM25Index()
+    for doc_id in vs.index_to_docstore_id.values():
+        doc = vs.docstore.search(doc_id)
+        if hasattr(doc, "page_content"):
+            sparse.add(doc_id, doc.page_content)
+    return sparse
+
+# -------- on-disk formats --------
+
+# "pickle": langchain's index.faiss + index.pkl
+# "mmap":   index.faiss + the pickle-free docstore/ sidecar (see rag/docstore.py)
+DOCSTORE_FORMATS = ("pickle", "mmap")
+
+def _load_store(index_dir: str, embeddings, docstore_format: str, mutable: bool):
+    """Load the saved store in the requested format; None when nothing usable is on disk."""
+    from langchain_community.vectorstores import FAISS
+    try:
+        # mutable loads always come from the sidecar's exact vectors when present,
+        # since compressed indexes cannot be edited in place
+        if docstore_exists(index_dir) and (mutable or docstore_format == "mmap"):
+            if mutable:
+                return load_mutable_store(index_dir, embeddings)
+            return load_mmap_store(index_dir, embeddings)
+        if os.path.exists(os.path.join(index_dir, "index.pkl")):
+            return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        if docstore_exists(index_dir):
+            return load_mutable_store(index_dir, embeddings)
+    except Exception:
+        return None
+    return None
+
+def _save_store(index_dir: str, vs, docstore_format: str, index_type: str = "flat", embeddings=None):
+    """
+    Persist `vs` (an exact, flat working store). The searchable index.faiss is
+    written in `index_type`; returns (store to serve queries from, index info).
+    The served store embeds queries with `embeddings` (default: vs's own), so a
+    build's CachedEmbeddings wrapper, and the cache matrix it holds, is not kept alive.
+    """
+    # the mmap sidecar is always written; it holds the canonical float32 vectors
+    vectors = vs.index.reconstruct_n(0, vs.index.ntotal) if vs.index.ntotal else None
+    write_docstore(index_dir, vs, vectors=vectors)
+
+    if index_type == "flat" or vectors is None:
+        index, info = vs.index, {"index_type": index_type, "effective_type": "flat", "factory": "Flat"}
+        served = vs
+    else:
+        from langchain_community.vectorstores import FAISS
+        index, info = build_faiss_index(vectors, index_type)
+        served = FAISS(vs.embedding_function, index, vs.docstore, vs.index_to_docstore_id)
+
+    # row metadata for pre-filtered retrieval (see rag/filters.py)
+    meta = MetadataIndex.from_store(vs)
+    meta.save(index_dir)
+
+    if docstore_format == "mmap":
+        import faiss
+        index_path, _ = _manifest_paths(index_dir)
+        faiss.write_index(index, index_path)
+        stale_pkl = os.path.join(index_dir, "index.pkl")
+        if os.path.exists(stale_pkl):
+            os.remove(stale_pkl)
+        # serve from the files just written, exactly as after a restart
+        served = load_mmap_store(index_dir, embeddings or vs.embedding_function)
+        configure_search(served.index, info)
+    else:
+        served.save_local(index_dir)
+        if embeddings is not None:
+            served.embedding_function = embeddings
+    served.metadata_index = meta
+    return served, info
+
+def _attach_metadata(vs, index_dir: str) -> None:
+    """Attach the saved row metadata to a loaded store, rewriting it if missing or stale."""
+    meta = MetadataIndex.load(index_dir)
+    if meta is None or len(meta) != len(vs.index_to_docstore_id):
+        meta = MetadataIndex.from_store(vs)
+        meta.save(index_dir)
+    vs.metadata_index = meta
+
+# -------- main build / load --------
+
+def _needs_full_rebuild(manifest: dict, shard: Optional[Shard]) -> bool:
+    if not manifest:
+        return False
+    # chunks from an older chunker cannot be patched incrementally: rebuild them all
+    # (as are indexes built before duplicates were filtered out, or under other dedup rules)
+    if manifest.get("chunker") != CHUNKER_VERSION or manifest.get("dedup", {}).get("version") != DEDUP_VERSION:
+        return True
+    # a different slice of the corpus shares nothing with what is on disk
+    return manifest.get("shard") != (list(shard) if shard else None)
+
+def index_is_stale(index_dir: str, data_signature: str, index_type: str = "flat",
+                   shard: Optional[Shard] = None) -> bool:
+    """True when build_or_load_index would have to (re)build rather than just load."""
+    manifest = _read_manifest(index_dir)
+    index_path, _ = _manifest_paths(index_dir)
+    return (
+        _needs_full_rebuild(manifest, shard)
+        or manifest.get("data_signature") != data_signature
+        or manifest.get("index", {}).get("index_type", "flat") != index_type
+        or not os.path.exists(index_path)
+    )
+
+def build_or_load_index(
+    index_dir: str = "index",
+    data_dir: str = "data",
+    data_signature: str = None,
+    force_rebuild: bool = False,
+    cache_dir: str = ".cache/embeddings",
+    docstore_format: str = "pickle",
+    index_type: str = "flat",
+    embeddings=None,
+    progress: Progress = None,
+    shard: Optional[Shard] = None,
+):
+    """
+    Load the index for `data_dir`, rebuilding (incrementally when possible) if the data changed.
+    `embeddings` overrides the default MiniLM model (e.g. a deterministic stand-in for benchmarks).
+    `progress(stage, fraction)` is called as a rebuild advances.
+    `shard=(number, count)` indexes only that slice of `data_dir` (see rag/shards.py).
+    """
+    progress = progress or _no_progress
+    if docstore_format not in DOCSTORE_FORMATS:
+        raise ValueError(f"docstore_format must be one of {DOCSTORE_FORMATS}, got {docstore_format!r}")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
+    os.makedirs(index_dir, exist_ok=True)
+    index_path, _ = _manifest_paths(index_dir)
+
+    if data_signature is None:
+        data_signature = get_data_signature(data_dir, shard)
+
+    manifest = _read_manifest(index_dir)
+    force_rebuild = force_rebuild or _needs_full_rebuild(manifest, shard)
+    needs_rebuild = force_rebuild or index_is_stale(index_dir, data_signature, index_type, shard)
+
+    from rag.embeddings import as_engine, get_embeddings
+    if embeddings is None:
+        # shared: rebuilds and reloads must not each load another copy of the model
+        embeddings = get_embeddings(EMBED_MODEL)
+    # counts what a rebuild actually had to encode (cache misses), for the manifest
+    embeddings = engine = as_engine(embeddings)
+    # the embedding cache is per model, so custom embedders get their own file
+    model_name = getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+    if not needs_rebuild:
+        vs = _load_store(index_dir, embeddings, docstore_format, mutable=False)
+        if vs is not None:
+            if docstore_format == "mmap" and not docstore_exists(index_dir):
+                # one-time migration of an index saved in the pickle format
+                _save_store(index_dir, vs, docstore_format)
+            configure_search(vs.index, manifest.get("index", {}))
+            if BM25Index.load(index_dir) is None:
+                _sparse_from_store(vs).save(index_dir)
+            _attach_metadata(vs, index_dir)
+            return vs
+
+    # chunk vectors come from the on-disk cache whenever the text was seen before
+    from rag.embedding_cache import EmbeddingCache, CachedEmbeddings
+    embeddings = CachedEmbeddings(embeddings, EmbeddingCache(cache_dir, model_name))
+    before = engine.snapshot()
+
+    progress("scanning", 0.0)
+    files = _list_data_files(data_dir, shard)
+    current = {_rel_path(f, data_dir): h for f, h in hash_files(files).items()}
+    old_sources = manifest.get("sources")
+
+    # Incremental path: only re-embed added/modified files, drop vectors of
+    # changed/deleted ones. Needs a manifest that already tracks per-file ids.
+    if not force_rebuild and old_sources is not None and os.path.exists(index_path):
+        vs = _load_store(index_dir, embeddings, docstore_format, mutable=True)
+        if vs is not None:
+            sparse = BM25Index.load(index_dir) or _sparse_from_store(vs)
+            sources, dedup = _apply_changes(vs, data_dir, embeddings, sparse, old_sources, current, progress,
+                                            Deduplicator.load(index_dir))
+            progress("saving", 0.95)
+            embeddings.cache.save()
+            vs, info = _save_store(index_dir, vs, docstore_format, index_type, embeddings=engine)
+            sparse.save(index_dir)
+            dedup.save(index_dir)
+            _write_manifest(index_dir, data_signature, files, sources, index=info, chunker=CHUNKER_VERSION,
+                            dedup=dedup_report(sources), shard=list(shard) if shard else None,
+                            embedding=engine.stats(before))
+            progress("done", 1.0)
+            return vs
+
+    # Build fresh
+    sparse, dedup = BM25Index(), Deduplicator()
+    vs, sources = _embed_files(None, files, data_dir, embeddings, current, sparse, progress, dedup)
+    progress("saving", 0.95)
+    embeddings.cache.save()
+    vs, info = _save_store(index_dir, vs, docstore_format, index_type, embeddings=engine)
+    sparse.save(index_dir)
+    dedup.save(index_dir)
+    _write_manifest(index_dir, data_signature, files, sources, index=info, chunker=CHUNKER_VERSION,
+                    dedup=dedup_report(sources), shard=list(shard) if shard else None,
+                    embedding=engine.stats(before))
+    progress("done", 1.0)
+    return vs
@@ -0,0 +1,190 @@
+# ===========================================
+# chunking.py — structure-aware chunking
+# Markdown is split along its heading hierarchy, PDFs per page and per
+# detected section, plain text by paragraphs. Every chunk carries
+# `start_index` (offset in its file / page text) and, where known, a
+# `heading_path` like "Projects > Izimpisi".
+# Pure Python (no langchain) so it can run inside the loader workers.
+# ===========================================
+
+import re
+from typing import List, Optional, Tuple
+
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 120
+# sections shorter than this are merged with the following one(s)
+MIN_SECTION = 200
+# bump when chunk boundaries or chunk metadata change so existing indexes are rebuilt
+CHUNKER_VERSION = "structured-3"
+
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_FENCE_RE = re.compile(r"^(```|~~~)")
+# **bold**, __bold__, *em*, `code`, and _em_ only at word edges (keeps snake_case intact)
+_EMPHASIS_RE = re.compile(r"(\*\*|__|\*|`)(.+?)\1|(?<!\w)_(.+?)_(?!\w)")
+HEADING_SEP = " > "
+
+Chunk = Tuple[str, dict]   # (text, metadata)
+
+
+# -------- size-bounded splitting --------
+
+def _spans(text: str, start: int, end: int, size: int, seps: Tuple[str, ...]) -> List[Tuple[int, int]]:
+    """Cut text[start:end] into spans of at most `size`, preferring the coarsest separator."""
+    if end - start <= size:
+        return [(start, end)]
+    if not seps:
+        return [(i, min(i + size, end)) for i in range(start, end, size)]
+    out, pos = [], start
+    while pos < end:
+        j = text.find(seps[0], pos, end)
+        stop = end if j == -1 else j + len(seps[0])
+        out.extend(_spans(text, pos, stop, size, seps[1:]))
+        pos = stop
+    return out
+
+def split_text(text: str, start: int = 0, end: int = None, chunk_size: int = CHUNK_SIZE,
+               chunk_overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, str]]:
+    """(offset, chunk) pairs covering text[start:end]; chunks are stripped substrings of `text`."""
+    end = len(text) if end is None else end
+    pieces = _spans(text, start, end, chunk_size, _SEPARATORS)
+    windows, cur = [], []
+    for piece in pieces:
+        if cur and piece[1] - cur[0][0] > chunk_size:
+            windows.append((cur[0][0], cur[-1][1]))
+            # carry trailing pieces forward as overlap, as long as the next chunk still fits
+            while cur and (cur[-1][1] - cur[0][0] > chunk_overlap or piece[1] - cur[0][0] > chunk_size):
+                cur.pop(0)
+        cur.append(piece)
+    if cur:
+        windows.append((cur[0][0], cur[-1][1]))
+    out = []
+    for s, e in windows:
+        segment = text[s:e]
+        stripped = segment.strip()
+        if stripped:
+            out.append((s + len(segment) - len(segment.lstrip()), stripped))
+    return out
+
+
+def _join_headings(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """
+    Heading of two merged sections: a child extends its parent's path ("People" +
+    "People > Fortu" -> "People > Fortu"); siblings keep their common path and list
+    both ("People > Fortu" + "People > Khonzi" -> "People > Fortu, Khonzi").
+    """
+    if not a or not b or a == b:
+        return a or b
+    pa, pb = a.split(HEADING_SEP), b.split(HEADING_SEP)
+    common = 0
+    while common < min(len(pa), len(pb)) and pa[common] == pb[common]:
+        common += 1
+    if common == len(pa):
+        return b
+    if common == len(pb):
+        return a
+    tail = HEADING_SEP.join(pa[common:]) + ", " + HEADING_SEP.join(pb[common:])
+    return HEADING_SEP.join(pa[:common] + [tail])
+
+def _merge_small(sections: list, min_size: int = MIN_SECTION) -> list:
+    """Merge adjacent (start, end, heading) sections until each is at least `min_size` chars."""
+    merged = []
+    for start, end, heading in sections:
+        if merged and merged[-1][1] - merged[-1][0] < min_size:
+            prev_start, _, prev_heading = merged[-1]
+            merged[-1] = (prev_start, end, _join_headings(prev_heading, heading))
+        else:
+            merged.append((start, end, heading))
+    return merged
+
+
+# -------- Markdown --------
+
+def _heading_title(raw: str) -> str:
+    """Heading text without emphasis/code markup ("**Khonzi**" -> "Khonzi")."""
+    prev = None
+    while prev != raw:
+        prev, raw = raw, _EMPHASIS_RE.sub(lambda m: m.group(2) or m.group(3), raw)
+    return raw.strip()
+
+def markdown_sections(text: str) -> List[Tuple[int, int, List[str]]]:
+    """(start, end, heading path) per section; headings inside code fences are ignored."""
+    sections, path, start, in_fence, pos = [], [], 0, False, 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if _FENCE_RE.match(stripped):
+            in_fence = not in_fence
+        m = None if in_fence else _HEADING_RE.match(stripped)
+        if m:
+            if pos > start:
+                sections.append((start, pos, list(path)))
+            level = len(m.group(1))
+            path = path[:level - 1] + [""] * max(0, level - 1 - len(path)) + [_heading_title(m.group(2))]
+            start = pos
+        pos += len(line)
+    if pos > start:
+        sections.append((start, pos, list(path)))
+    return sections
+
+def _section_has_body(text: str, start: int, end: int) -> bool:
+    lines = [l for l in text[start:end].splitlines() if l.strip()]
+    return len(lines) > 1 or (len(lines) == 1 and not _HEADING_RE.match(lines[0].strip()))
+
+def chunk_markdown(text: str, metadata: dict) -> List[Chunk]:
+    sections = [(start, end, HEADING_SEP.join(p for p in path if p))
+                for start, end, path in markdown_sections(text)
+                # a bare heading still shows up in its children's paths
+                if _section_has_body(text, start, end)]
+    chunks = []
+    for start, end, heading in _merge_small(sections):
+        for offset, chunk in split_text(text, start, end):
+            meta = {**metadata, "start_index": offset}
+            if heading:
+                meta["heading_path"] = heading
+            chunks.append((chunk, meta))
+    return chunks
+
+
+# -------- PDF pages --------
+
+def _looks_like_heading(line: str) -> bool:
+    """Short upper-case line without sentence punctuation (resume-style section titles)."""
+    line = line.strip()
+    if not line or len(line) > 60 or len(line.split()) > 8 or line[-1] in ".,;:!?":
+        return False
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and line.isupper()
+
+def chunk_pdf_page(text: str, metadata: dict, heading: Optional[str] = None) -> Tuple[List[Chunk], Optional[str]]:
+    """Chunks of one page split at detected section headings; returns the heading open at page end."""
+    bounds, pos = [], 0
+    for line in text.splitlines(keepends=True):
+        if _looks_like_heading(line):
+            bounds.append((pos, line.strip()))
+        pos += len(line)
+    sections, start = [], 0
+    for at, title in bounds:
+        if at > start:
+            sections.append((start, at, heading))
+        start, heading = at, title
+    sections.append((start, len(text), heading))
+    chunks = []
+    for s, e, title in _merge_small(sections):
+        for offset, chunk in split_text(text, s, e):
+            meta = {**metadata, "start_index": offset}
+            if title:
+                meta["heading_path"] = title
+            chunks.append((chunk, meta))
+    return chunks, heading
+
+
+# -------- entry point --------
+
+def chunk_extracted(text: str, metadata: dict, heading: Optional[str] = None) -> Tuple[List[Chunk], Optional[str]]:
+    """Chunk one extracted file / PDF page. `heading` threads PDF sections across pages."""
+    source = metadata.get("source", "").lower()
+    if "page" in metadata:
+        return chunk_pdf_page(text, metadata, heading)
+    if source.endswith(".md"):
+        return chunk_markdown(text, metadata), None
+    return [(chunk, {**metadata, "start_index": offset}) for offset, chunk in split_text(text)], None
@@ -0,0 +1,142 @@
+# ===========================================
+# context.py — token-budgeted context packing
+# Sits between retrieve() and build_llm_prompt(): merges adjacent or
+# overlapping chunks of the same source, drops near-duplicate passages,
+# keeps relevance order and stops at a token budget instead of a fixed k.
+# ===========================================
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# rough chars-per-token for English prose (MiniLM / Gemini tokenizers are close to this)
+CHARS_PER_TOKEN = 4
+# the longest chunk overlap we look for when chunks carry no start_index
+_MAX_TEXT_OVERLAP = 400
+# chunks separated by at most this many chars (stripped whitespace) count as adjacent
+_ADJACENT_GAP = 16
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Passage:
+    text: str
+    rank: int                      # best (lowest) retrieval rank among merged chunks
+    source: Optional[str] = None
+    page: Optional[int] = None
+    start: Optional[int] = None    # start_index of the first merged chunk, when known
+    docs: list = field(default_factory=list)
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+def _text_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    for k in range(min(len(a), len(b), _MAX_TEXT_OVERLAP), 0, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+def _try_merge(p: Passage, q: Passage) -> Optional[Passage]:
+    """Merge q into p if they are contiguous/overlapping pieces of the same source page."""
+    if p.source is None or p.source != q.source or p.page != q.page:
+        return None
+    if p.start is not None and q.start is not None:
+        first, second = (p, q) if p.start <= q.start else (q, p)
+        gap = second.start - first.end
+        if gap > _ADJACENT_GAP:
+            return None
+        if gap > 0:
+            text = first.text + "\n" + second.text
+        elif second.end <= first.end:
+            text = first.text        # second is fully inside first
+        else:
+            text = first.text + second.text[first.end - second.start:]
+        start = first.start
+    else:
+        k = _text_overlap(p.text, q.text)
+        if k:
+            text, start = p.text + q.text[k:], p.start
+        else:
+            k = _text_overlap(q.text, p.text)
+            if not k:
+                return None
+            text, start = q.text + p.text[k:], q.start
+    return Passage(text=text, rank=min(p.rank, q.rank), source=p.source, page=p.page,
+                   start=start, docs=p.docs + q.docs)
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+def _is_near_duplicate(a: set, b: set, threshold: float) -> bool:
+    if not a or not b:
+        return False
+    inter = len(a & b)
+    # containment catches a short chunk repeated inside a longer merged passage
+    return inter / len(a | b) >= threshold or inter / min(len(a), len(b)) >= threshold
+
+
+def merge_passages(docs: list) -> List[Passage]:
+    """Turn ranked docs into passages, merging neighbours from the same source page."""
+    passages: List[Passage] = []
+    for rank, doc in enumerate(docs):
+        meta = getattr(doc, "metadata", {}) or {}
+        cur = Passage(text=doc.page_content, rank=rank, source=meta.get("source"),
+                      page=meta.get("page"), start=meta.get("start_index"), docs=[doc])
+        # keep folding until nothing else touches it (a new chunk can bridge two passages)
+        merged = True
+        while merged:
+            merged = False
+            for i, p in enumerate(passages):
+                m = _try_merge(p, cur)
+                if m is not None:
+                    cur = m
+                    passages.pop(i)
+                    merged = True
+                    break
+        passages.append(cur)
+    return sorted(passages, key=lambda p: p.rank)
+
+def dedupe_passages(passages: List[Passage], threshold: float = 0.8) -> List[Passage]:
+    """Drop passages that mostly repeat a more relevant one."""
+    kept, kept_shingles = [], []
+    for p in passages:
+        sh = _shingles(p.text)
+        if any(_is_near_duplicate(sh, other, threshold) for other in kept_shingles):
+            continue
+        kept.append(p)
+        kept_shingles.append(sh)
+    return kept
+
+def pack_context(docs: list, token_budget: int = 1200, dedup_threshold: float = 0.8) -> Tuple[str, List[Passage]]:
+    """
+    Build the CONTEXT block from ranked docs within `token_budget` (estimated tokens).
+    Returns (context string, passages used) — same "[Doc i]: ..." layout as retrieve().
+    """
+    passages = dedupe_passages(merge_passages(docs), dedup_threshold)
+    used, remaining = [], token_budget
+    for p in passages:
+        cost = estimate_tokens(p.text)
+        if cost <= remaining:
+            used.append(p)
+            remaining -= cost
+        elif not used:
+            # the most relevant passage alone is over budget: keep its head
+            p.text = p.text[: token_budget * CHARS_PER_TOKEN]
+            used.append(p)
+            remaining = 0
+        if remaining <= 0:
+            break
+    context = "\n\n".join(f"[Doc {i+1}]: {p.text}" for i, p in enumerate(used))
+    return context, used
@@ -0,0 +1,215 @@
+# ===========================================
+# dedup.py — ingest-time duplicate elimination
+# Whole documents are dropped only as exact copies (normalized-text hash);
+# chunks also by MinHash/LSH near-duplicate detection, so a near copy of
+# a document that adds new sections keeps those. The first copy seen
+# wins; later copies are not embedded, stored or retrieved.
+# The state (signatures, LSH band keys, exact keys) is saved next to the
+# manifest (dedup.npz, no pickle), so an incremental update only removes
+# and adds the changed sources instead of re-hashing the whole corpus.
+# ===========================================
+
+import os
+import re
+import zlib
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16                      # 16 bands x 8 rows: LSH candidates from Jaccard ~0.7 upwards
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+CHUNK_THRESHOLD = 0.9           # estimated Jaccard at which a chunk counts as a copy
+# bump when the dedup rules change; indexes recorded under other rules are rebuilt
+DEDUP_VERSION = 2
+DEDUP_FILE = "dedup.npz"
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.int64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.int64)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+def exact_key(text: str) -> str:
+    """Hash of the text with case, punctuation and whitespace normalized away."""
+    return hashlib.sha1(" ".join(_words(text)).encode("utf-8")).hexdigest()
+
+def minhash(text: str) -> np.ndarray:
+    """NUM_PERM-wide MinHash signature over word 3-shingles (stable across runs)."""
+    words = _words(text)
+    n = min(SHINGLE_WORDS, max(1, len(words)))
+    shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.int64, count=len(shingles))
+    x %= _PRIME
+    # (a*x + b) mod p for every shingle x permutation at once; x, a < 2^31 keeps it in int64
+    return ((np.outer(x, _A) + _B) % _PRIME).min(axis=0)
+
+def band_keys(sigs: np.ndarray) -> np.ndarray:
+    """(n, BANDS) uint64 hash of each signature band: the LSH bucket keys."""
+    rows = np.asarray(sigs).reshape(-1, BANDS, ROWS).astype(np.uint64)
+    keys = np.zeros(rows.shape[:2], dtype=np.uint64)
+    for r in range(ROWS):
+        keys = keys * np.uint64(1000003) + rows[:, :, r]    # wraps mod 2^64
+    return keys
+
+
+class LSHIndex:
+    """Exact-hash map + banded MinHash buckets; check_and_add() returns the match for a duplicate."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._exact: Dict[str, str] = {}                            # exact key -> item key
+        self._items: Dict[str, Tuple[str, np.ndarray, List[int]]] = {}   # key -> (exact key, sig, band keys)
+        self._buckets: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def keys(self):
+        return self._items.keys()
+
+    def find(self, text: str, sig: np.ndarray = None, exact: str = None) -> Optional[Tuple[str, str, float]]:
+        """(key of the earlier copy, "exact" | "near", similarity) or None."""
+        key = self._exact.get(exact_key(text) if exact is None else exact)
+        if key is not None:
+            return key, "exact", 1.0
+        sig = minhash(text) if sig is None else sig
+        best = None
+        for b, h in enumerate(band_keys(sig)[0].tolist()):
+            for other in self._buckets.get((b, h), ()):
+                sim = float(np.mean(self._items[other][1] == sig))
+                if sim >= self.threshold and (best is None or sim > best[2]):
+                    best = (other, "near", round(sim, 3))
+        return best
+
+    def _insert(self, key: str, exact: str, sig: np.ndarray, bands: List[int]) -> None:
+        self._exact.setdefault(exact, key)
+        self._items[key] = (exact, sig, bands)
+        for b, h in enumerate(bands):
+            self._buckets[(b, h)].append(key)
+
+    def add(self, key: str, text: str, sig: np.ndarray = None) -> None:
+        sig = minhash(text) if sig is None else sig
+        self._insert(key, exact_key(text), sig, band_keys(sig)[0].tolist())
+
+    def remove(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        exact, _, bands = item
+        if self._exact.get(exact) == key:
+            del self._exact[exact]
+        for b, h in enumerate(bands):
+            bucket = self._buckets.get((b, h))
+            if bucket is not None:
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[(b, h)]
+
+    def check_and_add(self, key: str, text: str) -> Optional[Tuple[str, str, float]]:
+        exact = exact_key(text)
+        sig = minhash(text)
+        match = self.find(text, sig, exact)
+        if match is None:
+            self._insert(key, exact, sig, band_keys(sig)[0].tolist())
+        return match
+
+
+class Deduplicator:
+    """Document- and chunk-level duplicate filter for one index build."""
+
+    def __init__(self, chunk_threshold: float = CHUNK_THRESHOLD):
+        self.docs: Dict[str, str] = {}      # exact key of a whole file -> first source with it
+        self.chunks = LSHIndex(chunk_threshold)
+
+    def seed(self, source: str, chunks: List[Tuple[str, str]]) -> None:
+        """Register an already-indexed file: (chunk id, text) pairs."""
+        self.docs.setdefault(exact_key("\n".join(text for _, text in chunks)), source)
+        for chunk_id, text in chunks:
+            self.chunks.add(chunk_id, text)
+
+    def filter_file(self, source: str, chunks: List[Tuple[str, str]]):
+        """
+        Returns (kept (chunk id, text) pairs, document match or None, dropped chunk reports).
+        An exact copy of an earlier document keeps none of its chunks; anything else,
+        near copies included, is filtered chunk by chunk.
+        """
+        key = exact_key("\n".join(text for _, text in chunks))
+        first = self.docs.get(key)
+        if first is not None:
+            return [], {"duplicate_of": first, "kind": "exact", "similarity": 1.0}, []
+        self.docs[key] = source
+        kept, dropped = [], []
+        for chunk_id, text in chunks:
+            hit = self.chunks.check_and_add(chunk_id, text)
+            if hit is None:
+                kept.append((chunk_id, text))
+            else:
+                dropped.append({"id": chunk_id, "duplicate_of": hit[0], "kind": hit[1], "similarity": hit[2]})
+        return kept, None, dropped
+
+    def remove_sources(self, sources) -> None:
+        """Forget changed / deleted files, so their new versions are judged afresh."""
+        sources = set(sources)
+        if not sources:
+            return
+        for chunk_id in [k for k in self.chunks.keys() if chunk_source(k) in sources]:
+            self.chunks.remove(chunk_id)
+        self.docs = {key: src for key, src in self.docs.items() if src not in sources}
+
+    # -------- persistence --------
+
+    def save(self, index_dir: str) -> None:
+        items = self.chunks._items
+        keys = list(items)
+        payload = {
+            "version": np.array([DEDUP_VERSION, NUM_PERM, BANDS]),
+            "threshold": np.array([self.chunks.threshold]),
+            "chunk_ids": np.array(keys, dtype=str),
+            "exact": np.array([items[k][0] for k in keys], dtype=str),
+            # MinHash values are < 2^31
+            "sigs": np.array([items[k][1] for k in keys], dtype=np.int32).reshape(len(keys), NUM_PERM),
+            "bands": np.array([items[k][2] for k in keys], dtype=np.uint64).reshape(len(keys), BANDS),
+            "doc_keys": np.array(list(self.docs), dtype=str),
+            "doc_sources": np.array(list(self.docs.values()), dtype=str),
+        }
+        path = os.path.join(index_dir, DEDUP_FILE)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **payload)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["Deduplicator"]:
+        """Saved state, or None when missing / written by other dedup rules."""
+        try:
+            with np.load(os.path.join(index_dir, DEDUP_FILE), allow_pickle=False) as z:
+                if z["version"].tolist() != [DEDUP_VERSION, NUM_PERM, BANDS]:
+                    return None
+                dedup = cls(chunk_threshold=float(z["threshold"][0]))
+                sigs = z["sigs"].astype(np.int64)
+                for key, exact, sig, bands in zip(z["chunk_ids"].tolist(), z["exact"].tolist(), sigs,
+                                                  z["bands"].tolist()):
+                    dedup.chunks._insert(key, exact, sig, bands)
+                dedup.docs = dict(zip(z["doc_keys"].tolist(), z["doc_sources"].tolist()))
+            return dedup
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def chunk_source(chunk_id: str) -> str:
+    return chunk_id.rsplit("::", 1)[0]
+
+def dedup_report(sources: Dict[str, dict]) -> dict:
+    """Manifest summary of what was dropped, built from the per-source entries."""
+    documents = [{"source": rel, **entry["duplicate"]} for rel, entry in sorted(sources.items())
+                 if entry.get("duplicate")]
+    chunks = [d for _, entry in sorted(sources.items()) for d in entry.get("dropped_chunks", [])]
+    return {"version": DEDUP_VERSION, "dropped_documents": len(documents), "dropped_chunks": len(chunks),
+            "documents": documents, "chunks": chunks}
@@ -0,0 +1,160 @@
+# ===========================================
+# docstore.py — pickle-free, memory-mapped docstore
+# Layout under <index_dir>/docstore/:
+#   texts.bin    all chunk texts, utf-8, back to back
+#   offsets.npy  int64 [n+1]; chunk i is texts.bin[offsets[i]:offsets[i+1]]
+#   ids.json     docstore id per FAISS position
+#   meta.jsonl   one metadata object per line, parsed only when a hit needs it
+#   vectors.npy  float32 [n, dim], row i == FAISS position i
+# Nothing is unpickled; Documents are materialized only for returned hits.
+# ===========================================
+
+import os
+import json
+import shutil
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+DOCSTORE_DIR = "docstore"
+
+
+def docstore_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, DOCSTORE_DIR, "ids.json"))
+
+def _store_vectors(vs) -> np.ndarray:
+    n = vs.index.ntotal
+    if n == 0:
+        return np.zeros((0, vs.index.d), dtype=np.float32)
+    return np.asarray(vs.index.reconstruct_n(0, n), dtype=np.float32)
+
+def write_docstore(index_dir: str, vs, vectors: np.ndarray = None) -> None:
+    """Export a langchain FAISS store to the mmap layout (written to a temp dir, then swapped in)."""
+    final = os.path.join(index_dir, DOCSTORE_DIR)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    n = vs.index.ntotal
+    ids = [vs.index_to_docstore_id[i] for i in range(n)]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    with open(os.path.join(tmp, "texts.bin"), "wb") as texts, \
+         open(os.path.join(tmp, "meta.jsonl"), "w", encoding="utf-8") as meta:
+        for i, doc_id in enumerate(ids):
+            doc = vs.docstore.search(doc_id)
+            raw = doc.page_content.encode("utf-8")
+            texts.write(raw)
+            offsets[i + 1] = offsets[i] + len(raw)
+            meta.write(json.dumps(doc.metadata, ensure_ascii=False) + "\n")
+    np.save(os.path.join(tmp, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp, "vectors.npy"), _store_vectors(vs) if vectors is None else vectors)
+    with open(os.path.join(tmp, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f, ensure_ascii=False)
+
+    old = final + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class MmapDocstore:
+    """Read-only docstore over the mmap layout; mirrors InMemoryDocstore.search()."""
+
+    def __init__(self, index_dir: str):
+        root = os.path.join(index_dir, DOCSTORE_DIR)
+        self._offsets = np.load(os.path.join(root, "offsets.npy"), mmap_mode="r")
+        texts_path = os.path.join(root, "texts.bin")
+        self._texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else np.zeros(0, np.uint8)
+        with open(os.path.join(root, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        with open(os.path.join(root, "meta.jsonl"), "rb") as f:
+            self._meta_lines = f.read().splitlines()
+        self._pos = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def text(self, pos: int) -> str:
+        start, stop = int(self._offsets[pos]), int(self._offsets[pos + 1])
+        return self._texts[start:stop].tobytes().decode("utf-8")
+
+    def metadata(self, pos: int) -> dict:
+        return json.loads(self._meta_lines[pos])
+
+    def get(self, pos: int) -> "Document":
+        from langchain_core.documents import Document
+        return Document(page_content=self.text(pos), metadata=self.metadata(pos))
+
+    def search(self, doc_id: str):
+        pos = self._pos.get(doc_id)
+        if pos is None:
+            return f"ID {doc_id} not found."
+        return self.get(pos)
+
+
+class MmapVectorStore:
+    """
+    Read-only stand-in for the langchain FAISS store, backed by the mmap layout.
+    Exposes the attributes/methods rag.retriever relies on.
+    """
+
+    def __init__(self, index_dir: str, embeddings):
+        import faiss
+        index_path = os.path.join(index_dir, "index.faiss")
+        try:
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            self.index = faiss.read_index(index_path)
+        self.docstore = MmapDocstore(index_dir)
+        self.index_to_docstore_id = dict(enumerate(self.docstore.ids))
+        self.vectors = np.load(os.path.join(index_dir, DOCSTORE_DIR, "vectors.npy"), mmap_mode="r")
+        self.embeddings = embeddings
+        self._normalize_L2 = False
+
+    def embedding_function(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Tuple["Document", float]]:
+        x = np.asarray([embedding], dtype=np.float32)
+        scores, idx = self.index.search(x, k)
+        return [(self.docstore.get(int(i)), float(s)) for s, i in zip(scores[0], idx[0]) if i != -1]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List["Document"]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple["Document", float]]:
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List["Document"]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
+
+
+def load_mmap_store(index_dir: str, embeddings) -> Optional[MmapVectorStore]:
+    if not docstore_exists(index_dir):
+        return None
+    return MmapVectorStore(index_dir, embeddings)
+
+def load_mutable_store(index_dir: str, embeddings):
+    """
+    Rebuild a mutable langchain FAISS store from the mmap layout, without any pickle.
+    The working index is always exact/flat (from vectors.npy) so deletes keep
+    positions and docstore ids aligned, whatever mode index.faiss was saved in.
+    """
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    if not docstore_exists(index_dir):
+        return None
+    ro = MmapDocstore(index_dir)
+    vectors = np.load(os.path.join(index_dir, DOCSTORE_DIR, "vectors.npy"))
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    if len(vectors):
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    docs = {doc_id: ro.get(i) for i, doc_id in enumerate(ro.ids)}
+    return FAISS(embeddings, index, InMemoryDocstore(docs), dict(enumerate(ro.ids)))
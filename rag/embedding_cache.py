@@ -0,0 +1,222 @@
+# ===========================================
+# embedding_cache.py — content-addressed embedding cache
+# Rebuilds only pay for chunks that were never embedded before.
+# ===========================================
+
+import os
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _model_slug(model_name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in model_name)
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on `path` (created if missing), across processes."""
+    with open(path, "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:         # Windows
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:     # LK_LOCK gives up after ~10 s; keep waiting
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of chunk vectors for one embedding model.
+    Layout (per model), one file so vectors and keys are always replaced together:
+        <slug>.npz   "vectors" float32 matrix, one row per cached chunk; "keys" text hash
+                     per row; "last_used" tick per row; "tick"
+        <slug>.lock  held while saving: a save merges what other writers saved meanwhile
+    Once the matrix exceeds `max_bytes`, least recently used rows are evicted on save.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        slug = _model_slug(model_name)
+        self._path = os.path.join(cache_dir, f"{slug}.npz")
+        self._lock_path = os.path.join(cache_dir, f"{slug}.lock")
+        # the .npy + .json pair written before the single-file format
+        self._legacy_paths = (os.path.join(cache_dir, f"{slug}.npy"), os.path.join(cache_dir, f"{slug}.json"))
+
+        self._vectors = None          # np.ndarray [n, dim] float32
+        self._rows: Dict[str, int] = {}
+        self._last_used: List[int] = []
+        self._tick = 0
+        self._pending: Dict[str, np.ndarray] = {}
+        self._load()
+
+    def _read(self) -> Optional[Tuple[np.ndarray, List[str], List[int], int]]:
+        """(vectors, keys, last_used, tick) as saved on disk, or None."""
+        try:
+            if os.path.exists(self._path):
+                with np.load(self._path, allow_pickle=False) as z:
+                    vectors, keys = z["vectors"], z["keys"].tolist()
+                    last_used, tick = z["last_used"].tolist(), int(z["tick"])
+            elif all(os.path.exists(p) for p in self._legacy_paths):
+                with open(self._legacy_paths[1], "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                vectors, keys = np.load(self._legacy_paths[0]), meta.get("keys", [])
+                last_used, tick = list(meta.get("last_used", [0] * len(keys))), int(meta.get("tick", 0))
+            else:
+                return None
+        except Exception:
+            # a corrupt cache is just an empty cache
+            return None
+        if len(keys) != len(vectors) or len(last_used) != len(keys):
+            return None
+        return vectors.astype(np.float32, copy=False), keys, last_used, tick
+
+    def _load(self) -> None:
+        saved = self._read()
+        if saved is None:
+            return
+        vectors, keys, self._last_used, self._tick = saved
+        self._vectors = vectors
+        self._rows = {k: i for i, k in enumerate(keys)}
+
+    def _merge_saved(self) -> None:
+        """Take in rows other writers saved since this cache was loaded."""
+        saved = self._read()
+        if saved is None:
+            return
+        vectors, keys, last_used, tick = saved
+        if self._vectors is not None and vectors.shape[1:] != self._vectors.shape[1:]:
+            return
+        self._tick = max(self._tick, tick)
+        new = []
+        for i, k in enumerate(keys):
+            row = self._rows.get(k)
+            if row is None:
+                new.append(i)
+                self._pending.pop(k, None)
+            else:
+                self._last_used[row] = max(self._last_used[row], last_used[i])
+        if not new:
+            return
+        start = len(self._rows)
+        self._vectors = vectors[new] if self._vectors is None else np.concatenate([self._vectors, vectors[new]])
+        self._rows.update((keys[i], start + j) for j, i in enumerate(new))
+        self._last_used.extend(last_used[i] for i in new)
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        self._tick += 1
+        found = {}
+        for k in keys:
+            row = self._rows.get(k)
+            if row is not None:
+                found[k] = self._vectors[row]
+                self._last_used[row] = self._tick
+            elif k in self._pending:
+                found[k] = self._pending[k]
+        return found
+
+    def put_many(self, keys: List[str], vectors) -> None:
+        for k, v in zip(keys, vectors):
+            if k not in self._rows:
+                self._pending[k] = np.asarray(v, dtype=np.float32)
+
+    def save(self) -> None:
+        """Merge pending and concurrently saved rows, evict LRU rows over the size budget, write atomically."""
+        if not self._pending and self._vectors is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with _file_lock(self._lock_path):
+            self._merge_saved()
+            self._write()
+
+    def _write(self) -> None:
+        keys = [None] * len(self._rows)
+        for k, i in self._rows.items():
+            keys[i] = k
+        last_used = list(self._last_used)
+        blocks = [self._vectors] if self._vectors is not None else []
+        if self._pending:
+            keys.extend(self._pending.keys())
+            last_used.extend([self._tick] * len(self._pending))
+            blocks.append(np.stack(list(self._pending.values())))
+        vectors = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+
+        row_bytes = vectors.shape[1] * vectors.itemsize
+        max_rows = max(1, self.max_bytes // row_bytes)
+        if len(keys) > max_rows:
+            keep = np.sort(np.argsort(np.asarray(last_used), kind="stable")[-max_rows:])
+            vectors = vectors[keep]
+            keys = [keys[i] for i in keep]
+            last_used = [last_used[i] for i in keep]
+
+        tmp = self._path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, vectors=vectors, keys=np.array(keys, dtype=str), last_used=np.asarray(last_used),
+                     tick=np.asarray(self._tick), model=np.asarray(self.model_name))
+        os.replace(tmp, self._path)
+        for path in self._legacy_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self._vectors = vectors
+        self._rows = {k: i for i, k in enumerate(keys)}
+        self._last_used = last_used
+        self._pending = {}
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document vectors from an EmbeddingCache."""
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_text_key(t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        # embed each distinct missing text once, in a single batch
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in missing:
+                missing[k] = t
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), vectors)
+            found.update(self.cache.get_many(list(missing.keys())))
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [found[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
@@ -0,0 +1,219 @@
+# ===========================================
+# embeddings.py — embedding models used by the index
+# get_embeddings() hands out one shared EmbeddingEngine per model and
+# process. Any langchain `Embeddings` plugs into an engine, which counts
+# throughput (chunks/s). SentenceTransformerEmbeddings drives MiniLM with
+# an explicit batch size, torch thread count and, for large rebuilds, a
+# pool of encoder processes. HashingEmbeddings is a deterministic,
+# dependency-free stand-in for MiniLM, for offline benchmarks and tests.
+# Tuning (environment): CODEX_EMBED_BATCH, CODEX_EMBED_THREADS,
+# CODEX_EMBED_PROCESSES.
+# ===========================================
+
+import os
+import re
+import math
+import time
+import atexit
+import hashlib
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of lowercase word unigrams + bigrams into `dim` buckets,
+    L2-normalized. Same text -> same vector on every machine and run.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return h % self.dim, 1.0 if (h >> 63) & 1 else -1.0
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN_RE.findall(text.lower())
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            i, sign = self._bucket(feature)
+            vec[i] += sign
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# -------- sentence-transformers --------
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, "") or default)
+    except ValueError:
+        return default
+
+DEFAULT_BATCH_SIZE = _env_int("CODEX_EMBED_BATCH", 64)
+DEFAULT_THREADS = _env_int("CODEX_EMBED_THREADS", os.cpu_count() or 1)
+# >1 starts a pool of encoder processes for large embed calls (rebuilds); 0/1 keeps encoding in-process
+DEFAULT_PROCESSES = _env_int("CODEX_EMBED_PROCESSES", 0)
+# smaller calls (queries, incremental updates) stay in-process: the pool's IPC would dominate
+MULTI_PROCESS_MIN_TEXTS = 256
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    sentence-transformers model with explicit encode settings. Produces the same vectors
+    as langchain's HuggingFaceEmbeddings (newlines flattened, no normalization), so
+    existing embedding caches stay valid. The model loads on first use.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = None, threads: int = None, processes: int = None):
+        self.model_name = model_name
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.threads = threads or DEFAULT_THREADS
+        self.processes = DEFAULT_PROCESSES if processes is None else processes
+        self._client = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                # intra-op parallelism of the encoder's matmuls; process-wide in torch
+                torch.set_num_threads(self.threads)
+                self._client = SentenceTransformer(self.model_name, device="cpu")
+            return self._client
+
+    def _process_pool(self):
+        client = self.client
+        with self._lock:
+            if self._pool is None:
+                # split the cores between workers instead of oversubscribing them
+                previous = os.environ.get("OMP_NUM_THREADS")
+                os.environ["OMP_NUM_THREADS"] = str(max(1, self.threads // self.processes))
+                try:
+                    self._pool = client.start_multi_process_pool(["cpu"] * self.processes)
+                finally:
+                    if previous is None:
+                        os.environ.pop("OMP_NUM_THREADS", None)
+                    else:
+                        os.environ["OMP_NUM_THREADS"] = previous
+                atexit.register(self.close)
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            from sentence_transformers import SentenceTransformer
+            SentenceTransformer.stop_multi_process_pool(pool)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        if not texts:
+            return []
+        if self.processes > 1 and len(texts) >= MULTI_PROCESS_MIN_TEXTS:
+            chunk = math.ceil(len(texts) / self.processes)
+            vectors = self.client.encode_multi_process(texts, self._process_pool(), batch_size=self.batch_size,
+                                                       chunk_size=chunk)
+        else:
+            vectors = self.client.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# -------- engine --------
+
+class EmbeddingEngine(Embeddings):
+    """
+    Pluggable front for any `Embeddings`: forwards calls to `base` and records how many
+    chunks were embedded and how long it took. stats() reports chunks per second.
+    """
+
+    def __init__(self, base: Embeddings):
+        self.base = base
+        self.model_name = getattr(base, "model_name", None) or type(base).__name__
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.calls = 0
+        self.seconds = 0.0
+
+    def _record(self, n: int, seconds: float) -> None:
+        with self._lock:
+            self.chunks += n
+            self.calls += 1
+            self.seconds += seconds
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        t0 = time.perf_counter()
+        vectors = self.base.embed_documents(texts)
+        self._record(len(texts), time.perf_counter() - t0)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        t0 = time.perf_counter()
+        vector = self.base.embed_query(text)
+        self._record(1, time.perf_counter() - t0)
+        return vector
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.chunks, self.calls, self.seconds
+
+    def stats(self, since: tuple = (0, 0, 0.0)) -> dict:
+        """Throughput overall, or since an earlier snapshot()."""
+        chunks, calls, seconds = (now - then for now, then in zip(self.snapshot(), since))
+        return {
+            "model": self.model_name,
+            "chunks": chunks,
+            "calls": calls,
+            "seconds": round(seconds, 4),
+            "chunks_per_s": round(chunks / seconds, 2) if seconds > 0 else None,
+            "batch_size": getattr(self.base, "batch_size", None),
+            "threads": getattr(self.base, "threads", None),
+            "processes": getattr(self.base, "processes", None),
+        }
+
+
+def as_engine(embeddings: Embeddings) -> EmbeddingEngine:
+    return embeddings if isinstance(embeddings, EmbeddingEngine) else EmbeddingEngine(embeddings)
+
+
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+def get_embeddings(model_name: str, batch_size: int = None, threads: int = None,
+                   processes: int = None) -> EmbeddingEngine:
+    """
+    Process-wide engine for `model_name`; created once, reused by every index version and
+    rebuild. Encode settings only apply to the first call for a model.
+    """
+    with _MODELS_LOCK:
+        if model_name not in _MODELS:
+            _MODELS[model_name] = EmbeddingEngine(SentenceTransformerEmbeddings(
+                model_name, batch_size=batch_size, threads=threads, processes=processes))
+        return _MODELS[model_name]
+
+def embedding_stats() -> List[dict]:
+    """Throughput of every shared engine created so far."""
+    with _MODELS_LOCK:
+        engines = list(_MODELS.values())
+    return [engine.stats() for engine in engines]
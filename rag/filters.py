@@ -0,0 +1,130 @@
+# ===========================================
+# filters.py — per-row metadata for pre-filtered retrieval
+# Written next to the index at build time (filters.json): for every
+# vector row its source, page and heading path, plus each source's file
+# type. rows(filters) turns a filter into the row subset the vector
+# search is restricted to, so nothing outside it is fetched and dropped.
+# Filters are plain dicts, all keys optional; a single value stands for a
+# one-element list:
+#   {"source": [...], "file_type": [...], "page": [...], "heading": "Projects"}
+# ===========================================
+
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FILTERS_FILE = "filters.json"
+FILTER_KEYS = ("source", "file_type", "page", "heading")
+# value type of each list-valued key
+_VALUE_TYPES = {"source": (str, "a string"), "file_type": (str, "a string"), "page": (int, "an integer")}
+
+
+def file_type(source: str) -> str:
+    return os.path.splitext(source)[1].lstrip(".").lower()
+
+def normalize_filters(filters: Optional[dict]) -> Optional[tuple]:
+    """Hashable, order-independent form of a filter (None when it filters nothing)."""
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"unknown filter keys {sorted(unknown)}; expected {FILTER_KEYS}")
+    out = []
+    for key in FILTER_KEYS:
+        value = filters.get(key)
+        if value is None or value == [] or value == "":
+            continue
+        if key == "heading":
+            if not isinstance(value, str):
+                raise ValueError("'heading' filter must be a string (a heading path prefix)")
+            out.append((key, value))
+            continue
+        # list-valued keys also take a single value: {"source": "people.md"}
+        values = value if isinstance(value, (list, tuple)) else [value]
+        kind, name = _VALUE_TYPES[key]
+        # bool is an int subclass, but {"page": true} is a mistake, not page 1
+        if not all(isinstance(v, kind) and not isinstance(v, bool) for v in values):
+            raise ValueError(f"'{key}' filter must be {name} or a list of them")
+        out.append((key, tuple(sorted(set(values), key=str))))
+    return tuple(out) or None
+
+
+class MetadataIndex:
+    """Row-aligned metadata of one index version (row i = vector i = index_to_docstore_id[i])."""
+
+    def __init__(self, sources: List[str], source_codes: np.ndarray, pages: np.ndarray, headings: List[str]):
+        self.sources = sources
+        self.source_codes = np.asarray(source_codes, dtype=np.int32)
+        self.pages = np.asarray(pages, dtype=np.int32)      # -1: not paged
+        self.headings = headings
+        self._codes = {s: i for i, s in enumerate(sources)}
+
+    def __len__(self) -> int:
+        return len(self.source_codes)
+
+    @classmethod
+    def from_store(cls, vs) -> "MetadataIndex":
+        sources, codes, pages, headings, seen = [], [], [], [], {}
+        for row in range(len(vs.index_to_docstore_id)):
+            doc = vs.docstore.search(vs.index_to_docstore_id[row])
+            meta = getattr(doc, "metadata", None) or {}
+            source = meta.get("source", "")
+            if source not in seen:
+                seen[source] = len(sources)
+                sources.append(source)
+            codes.append(seen[source])
+            page = meta.get("page")
+            pages.append(-1 if page is None else int(page))
+            headings.append(meta.get("heading_path", ""))
+        return cls(sources, np.asarray(codes), np.asarray(pages), headings)
+
+    def save(self, index_dir: str) -> None:
+        payload = {
+            "sources": self.sources,
+            "file_types": {s: file_type(s) for s in self.sources},
+            "source": self.source_codes.tolist(),
+            "page": self.pages.tolist(),
+            "heading": self.headings,
+        }
+        path = os.path.join(index_dir, FILTERS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["MetadataIndex"]:
+        try:
+            with open(os.path.join(index_dir, FILTERS_FILE), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            return cls(payload["sources"], np.asarray(payload["source"]), np.asarray(payload["page"]),
+                       payload["heading"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # -------- querying --------
+
+    def rows_by_source(self) -> Dict[str, int]:
+        """Vector count per source (the source -> ids index, summarized for display)."""
+        counts = np.bincount(self.source_codes, minlength=len(self.sources))
+        return {s: int(c) for s, c in zip(self.sources, counts)}
+
+    def rows(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Sorted row ids matching every given key; None for an empty filter."""
+        norm = normalize_filters(filters)
+        if norm is None:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in norm:
+            if key == "source":
+                mask &= np.isin(self.source_codes, [self._codes[s] for s in value if s in self._codes])
+            elif key == "file_type":
+                wanted = {v.lstrip(".").lower() for v in value}
+                mask &= np.isin(self.source_codes, [i for i, s in enumerate(self.sources) if file_type(s) in wanted])
+            elif key == "page":
+                mask &= np.isin(self.pages, list(value))
+            elif key == "heading":
+                # prefix match on the heading path ("Projects" matches "Projects > Izimpisi")
+                mask &= np.fromiter((h.startswith(value) for h in self.headings), dtype=bool, count=len(self))
+        return np.flatnonzero(mask)
@@ -0,0 +1,99 @@
+# ===========================================
+# index_types.py — compressed / quantized FAISS index modes
+# The canonical float32 vectors live in docstore/vectors.npy; the searchable
+# index.faiss is (re)built from them in the configured mode.
+# ===========================================
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+# flat  : exact float32 (IndexFlatL2)
+# fp16  : scalar quantization to float16 (2 bytes / dim)
+# sq8   : scalar quantization to uint8   (1 byte / dim)
+# ivf   : inverted file over float32 lists, probes a fraction of the clusters
+# ivfpq : inverted file + product quantization (~d/8 bytes / vector)
+INDEX_TYPES = ("flat", "fp16", "sq8", "ivf", "ivfpq")
+
+# faiss wants ~39 training points per centroid; below that we fall back
+MIN_POINTS_PER_CENTROID = 39
+PQ_NBITS = 8
+
+
+def _nlist(n: int) -> int:
+    return max(1, int(math.sqrt(n)))
+
+def _pq_m(d: int) -> int:
+    """Largest divisor of d that keeps ~8 dims per sub-quantizer."""
+    target = max(1, d // 8)
+    return max(m for m in range(1, target + 1) if d % m == 0)
+
+def choose_spec(index_type: str, n: int, d: int) -> Tuple[str, str, dict]:
+    """
+    Map a requested index type to a faiss factory string for n vectors.
+    Returns (effective type, factory string, search params). Types that need
+    training degrade gracefully until enough vectors exist.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
+    if index_type == "fp16":
+        return "fp16", "SQfp16", {}
+    if index_type == "sq8":
+        return "sq8", "SQ8", {}
+    if index_type in ("ivf", "ivfpq"):
+        nlist = _nlist(n)
+        nprobe = max(1, nlist // 4)
+        pq_points = MIN_POINTS_PER_CENTROID * (1 << PQ_NBITS)
+        if index_type == "ivfpq" and n >= max(pq_points, MIN_POINTS_PER_CENTROID * nlist):
+            m = _pq_m(d)
+            return "ivfpq", f"IVF{nlist},PQ{m}x{PQ_NBITS}", {"nprobe": nprobe}
+        if n >= MIN_POINTS_PER_CENTROID * nlist and nlist > 1:
+            return "ivf", f"IVF{nlist},Flat", {"nprobe": nprobe}
+    return "flat", "Flat", {}
+
+def build_faiss_index(vectors: np.ndarray, index_type: str):
+    """Build (and train if needed) an L2 index of the requested type. Returns (index, info)."""
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    effective, spec, params = choose_spec(index_type, n, d)
+    index = faiss.index_factory(d, spec, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    if n:
+        index.add(vectors)
+    configure_search(index, params)
+    info = {"index_type": index_type, "effective_type": effective, "factory": spec, **params}
+    return index, info
+
+def configure_search(index, params: dict) -> None:
+    """Apply search-time knobs (nprobe) that faiss does not persist in index.faiss."""
+    nprobe = params.get("nprobe")
+    if nprobe:
+        import faiss
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except Exception:
+            pass
+
+def index_bytes(index) -> int:
+    """Approximate size of `index` from ntotal, d and its codes, without serializing it."""
+    import faiss
+    index = faiss.downcast_index(index)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        # coarse centroids + a code and an int64 id per vector in the inverted lists
+        size = ivf.nlist * ivf.d * 4 + ivf.ntotal * (ivf.code_size + 8)
+        pq = getattr(faiss.downcast_index(ivf), "pq", None)
+        if pq is not None:
+            size += pq.M * pq.ksub * pq.dsub * 4    # PQ codebooks
+        return int(size)
+    code_size = getattr(index, "code_size", None)
+    if code_size is not None:
+        # flat / SQ: one code per vector (4*d bytes for float32)
+        return int(index.ntotal * code_size)
+    return int(faiss.serialize_index(index).size)   # anything else: measure
@@ -0,0 +1,180 @@
+# ===========================================
+# llm.py — LLM backends + streaming answer pipeline
+# Reuses one configured Gemini client and cleans tokens as they arrive.
+# ===========================================
+
+import os
+import re
+import time
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# -------- citation cleanup --------
+
+_CIT_PATTERNS = [
+    r"\(\s*Doc[s]?\s*[\d,\s]+\)",
+    r"\[\s*Doc[s]?\s*[\d,\s]+\s*\]",
+    r"\[\s*\d+(?:\s*,\s*\d+)*\s*\]",
+    r"\(\s*\d+(?:\s*,\s*\d+)*\s*\)",
+]
+# longest bracketed run we hold back waiting for it to close
+_MAX_CITATION = 48
+
+def clean_answer(text: str) -> str:
+    for pat in _CIT_PATTERNS:
+        text = re.sub(pat, "", text)
+    # remove double spaces left behind
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+
+class StreamingCleaner:
+    """
+    Incremental version of clean_answer().
+    Text after an unclosed "(" or "[" is held back until it closes (or grows
+    past _MAX_CITATION), so citations split across chunks are still removed.
+    Trailing whitespace is held back too, so runs of spaces collapse across chunks.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def _emit(self, segment: str) -> str:
+        for pat in _CIT_PATTERNS:
+            segment = re.sub(pat, "", segment)
+        segment = re.sub(r"\s{2,}", " ", segment)
+        if not self._started:
+            segment = segment.lstrip()
+        stripped = segment.rstrip()
+        # whitespace uncovered by a removed citation waits for the next segment
+        self._pending = segment[len(stripped):] + self._pending
+        if stripped:
+            self._started = True
+        return stripped
+
+    def feed(self, piece: str) -> str:
+        text = self._pending + piece
+        cut = len(text)
+        opener = max(text.rfind("("), text.rfind("["))
+        if opener != -1 and not any(c in text[opener:] for c in ")]") and cut - opener <= _MAX_CITATION:
+            cut = opener
+        while cut > 0 and text[cut - 1].isspace():
+            cut -= 1
+        self._pending = text[cut:]
+        return self._emit(text[:cut])
+
+    def finish(self) -> str:
+        text, self._pending = self._pending, ""
+        out = self._emit(text)
+        self._pending = ""
+        return out
+
+
+# -------- backends --------
+
+class GeminiBackend:
+    """Gemini client configured once per API key; models are reused across calls."""
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+        self._configured_key = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        key = os.environ.get("GEMINI_API_KEY", "")
+        if not key:
+            return None
+        with self._lock:
+            if key != self._configured_key or self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=key)
+                self._model = genai.GenerativeModel(self.model)
+                self._configured_key = key
+            return self._model
+
+    def warm(self) -> None:
+        """Import and configure the client ahead of the first question."""
+        self._get_model()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        m = self._get_model()
+        if m is None:
+            yield "⚠️ Missing GEMINI_API_KEY. Set it in Streamlit Cloud → Secrets."
+            return
+        try:
+            for chunk in m.generate_content(prompt, stream=True):
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        except Exception as e:
+            yield f"⚠️ Gemini error: {e}"
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+
+class FakeStreamingBackend:
+    """Offline stand-in: replays fixed chunks with an optional per-chunk delay."""
+
+    def __init__(self, chunks: Iterable[str], delay: float = 0.0, first_delay: float = 0.0):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.first_delay = first_delay
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for i, chunk in enumerate(self.chunks):
+            time.sleep(self.first_delay if i == 0 else self.delay)
+            yield chunk
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+def get_backend(model: str = DEFAULT_MODEL) -> GeminiBackend:
+    with _BACKENDS_LOCK:
+        if model not in _BACKENDS:
+            _BACKENDS[model] = GeminiBackend(model)
+        return _BACKENDS[model]
+
+
+# -------- streaming pipeline --------
+
+@dataclass
+class GenerationStats:
+    time_to_first_token: Optional[float] = None
+    total_time: Optional[float] = None
+    chunks: int = 0
+    chars: int = 0
+    clean_time: float = 0.0      # seconds spent in citation cleanup
+
+
+def stream_answer(backend, prompt: str, stats: GenerationStats = None) -> Iterator[str]:
+    """Yield cleaned answer text as the backend produces it, recording timings in `stats`."""
+    stats = stats if stats is not None else GenerationStats()
+    cleaner = StreamingCleaner()
+    start = time.perf_counter()
+
+    for chunk in backend.stream(prompt):
+        if stats.time_to_first_token is None:
+            stats.time_to_first_token = time.perf_counter() - start
+        stats.chunks += 1
+        t0 = time.perf_counter()
+        text = cleaner.feed(chunk)
+        stats.clean_time += time.perf_counter() - t0
+        if text:
+            stats.chars += len(text)
+            yield text
+    t0 = time.perf_counter()
+    text = cleaner.finish()
+    stats.clean_time += time.perf_counter() - t0
+    if text:
+        stats.chars += len(text)
+        yield text
+    stats.total_time = time.perf_counter() - start
@@ -0,0 +1,162 @@
+# ===========================================
+# loaders.py — parallel, streaming document extraction
+# Files (and page ranges of PDFs) are extracted — and optionally chunked —
+# in a process pool and yielded one page / file at a time, in a stable order.
+# Kept free of langchain imports so spawned workers start quickly.
+# ===========================================
+
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from rag.chunking import chunk_extracted
+
+# pages handed to one worker task; small enough to balance, big enough to amortize IPC
+PDF_PAGES_PER_TASK = 16
+
+Task = Tuple
+Extracted = Tuple[str, dict]   # (text, metadata)
+
+logger = logging.getLogger(__name__)
+
+
+# -------- worker side --------
+
+def _file_type(source: str) -> str:
+    # same as rag.filters.file_type (not imported: workers stay numpy-free)
+    return os.path.splitext(source)[1].lstrip(".").lower()
+
+def _extract_text_file(path: str, source: str) -> List[Extracted]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return [(text, {"source": source, "file_type": _file_type(source)})] if text.strip() else []
+
+def _extract_pdf_pages(path: str, source: str, start: int, stop: int) -> List[Extracted]:
+    """Pages [start, stop) of a PDF; `stop` is already clamped to its page count (see plan_tasks)."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    out = []
+    for page_no in range(start, stop):
+        try:
+            text = reader.pages[page_no].extract_text() or ""
+        except Exception as e:
+            # one bad page should not cost the rest of the range
+            logger.warning("skipping page %d of %s: %s: %s", page_no + 1, source, type(e).__name__, e)
+            continue
+        if text.strip():
+            out.append((text, {"source": source, "file_type": "pdf", "page": page_no}))
+    return out
+
+def _task_label(task: Task) -> str:
+    if task[0] == "pdf":
+        return f"{task[2]} (pages {task[3] + 1}-{task[4]})"
+    return task[2]
+
+def _run_task(task: Task) -> List[Extracted]:
+    kind = task[0]
+    if kind == "pdf":
+        return _extract_pdf_pages(*task[1:])
+    return _extract_text_file(*task[1:])
+
+def _run_chunk_task(task: Task) -> List[Extracted]:
+    """Extract, then chunk text files in the same worker; PDF pages come back whole (see iter_chunks)."""
+    if task[0] == "pdf":
+        return _run_task(task)
+    return [chunk for text, metadata in _run_task(task) for chunk in chunk_extracted(text, metadata)[0]]
+
+
+# -------- planning + scheduling --------
+
+def _pdf_page_count(path: str) -> int:
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(path).pages)
+    except Exception as e:
+        logger.warning("skipping unreadable PDF %s: %s: %s", path, type(e).__name__, e)
+        return 0
+
+def plan_tasks(paths: List[Tuple[str, str]]) -> List[Task]:
+    """
+    Turn (path, source) pairs into extraction tasks; PDFs are split into page ranges,
+    clamped to the page count read here so workers need not count again.
+    """
+    tasks = []
+    for path, source in paths:
+        lower = path.lower()
+        if lower.endswith(".pdf"):
+            n = _pdf_page_count(path)
+            for start in range(0, n, PDF_PAGES_PER_TASK):
+                tasks.append(("pdf", path, source, start, min(start + PDF_PAGES_PER_TASK, n)))
+        elif lower.endswith((".md", ".txt")):
+            tasks.append(("text", path, source))
+    return tasks
+
+def _bounded_map(tasks: List[Task], workers: int, window: int,
+                 fn: Callable[[Task], List[Extracted]] = _run_task) -> Iterator[List[Extracted]]:
+    """Like executor.map, but keeps at most `window` tasks in flight so results never pile up."""
+    ctx = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+        it = iter(tasks)
+        pending = deque((t, ex.submit(fn, t)) for t in islice(it, window))
+        while pending:
+            task, fut = pending.popleft()
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = _task_failed(task, e)
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, ex.submit(fn, nxt)))
+            yield result
+
+def _task_failed(task: Task, error: Exception) -> List[Extracted]:
+    # an unreadable file (or page range) is left out of the index, but never silently
+    logger.warning("skipping %s: %s: %s", _task_label(task), type(error).__name__, error)
+    return []
+
+def _run_inline(fn: Callable[[Task], List[Extracted]], task: Task) -> List[Extracted]:
+    try:
+        return fn(task)
+    except Exception as e:
+        return _task_failed(task, e)
+
+def _iter_results(paths: List[Tuple[str, str]], workers: Optional[int],
+                  fn: Callable[[Task], List[Extracted]]) -> Iterator[Extracted]:
+    tasks = plan_tasks(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    if workers <= 1:
+        results = (_run_inline(fn, t) for t in tasks)
+    else:
+        results = _bounded_map(tasks, workers, window=workers * 2, fn=fn)
+    for batch in results:
+        yield from batch
+
+def iter_extracted(paths: List[Tuple[str, str]], workers: Optional[int] = None) -> Iterator[Extracted]:
+    """
+    Yield (text, metadata) for every file / PDF page, in input order.
+    Runs inline for tiny jobs; otherwise fans out to a process pool.
+    """
+    return _iter_results(paths, workers, _run_task)
+
+def iter_chunks(paths: List[Tuple[str, str]], workers: Optional[int] = None) -> Iterator[Extracted]:
+    """
+    Like iter_extracted, but yields structure-aware chunks (see rag/chunking.py).
+    PDF pages are chunked here, in page order, so a section heading carries over
+    page breaks even where a PDF was split into several extraction tasks.
+    """
+    source, heading = None, None
+    for text, metadata in _iter_results(paths, workers, _run_chunk_task):
+        if "page" not in metadata:
+            yield text, metadata
+            continue
+        if metadata["source"] != source:
+            source, heading = metadata["source"], None
+        page_chunks, heading = chunk_extracted(text, metadata, heading)
+        yield from page_chunks
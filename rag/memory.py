@@ -0,0 +1,106 @@
+# ===========================================
+# memory.py — bounded conversation memory
+# Recent messages go into the prompt verbatim (oversized ones trimmed) up
+# to a token budget; older ones are folded, once, into a rolling summary.
+# Messages already in the summary are dropped from session state past a cap.
+# ===========================================
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+from rag.context import CHARS_PER_TOKEN, estimate_tokens
+
+# summarizer(previous_summary, newly_evicted_messages) -> new summary
+Summarizer = Callable[[str, List[dict]], str]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_SUMMARY_WORDS = 30
+
+
+def trim_message(text: str, max_tokens: int) -> str:
+    """Keep the head of an oversized message, cut at a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    head = text[: max_tokens * CHARS_PER_TOKEN]
+    cut = head.rfind(" ")
+    if cut > len(head) // 2:
+        head = head[:cut]
+    return head.rstrip() + " …[trimmed]"
+
+def _gist(text: str) -> str:
+    """First sentence, capped at _SUMMARY_WORDS words."""
+    first = _SENTENCE_RE.split(" ".join(text.split()), maxsplit=1)[0]
+    words = first.split()
+    return " ".join(words[:_SUMMARY_WORDS]) + (" …" if len(words) > _SUMMARY_WORDS else "")
+
+def extractive_summary(summary: str, messages: List[dict]) -> str:
+    """Default summarizer: append one gist line per evicted message (no LLM call)."""
+    lines = [summary] if summary else []
+    for m in messages:
+        who = "User asked" if m["role"] == "user" else "I answered"
+        lines.append(f"- {who}: {_gist(m['content'])}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Keeps the chat-history part of the prompt within `history_budget` tokens.
+    Lives in st.session_state next to the messages list it manages.
+    """
+
+    def __init__(self, history_budget: int = 600, message_budget: int = 250, summary_budget: int = 300,
+                 max_recent: int = 10, max_stored: int = 40, summarizer: Optional[Summarizer] = None):
+        self.history_budget = history_budget
+        self.max_recent = max_recent
+        self.message_budget = message_budget
+        self.summary_budget = summary_budget
+        self.max_stored = max_stored
+        self.summarizer = summarizer or extractive_summary
+        self.summary = ""
+        self.dropped = 0            # messages removed from session state so far
+        self._folded = 0            # messages[:_folded] are already in the summary
+
+    def reset(self) -> None:
+        self.summary = ""
+        self.dropped = 0
+        self._folded = 0
+
+    def _window_start(self, messages: List[dict]) -> int:
+        """Index of the oldest message that still fits the verbatim budget (newest always fits)."""
+        used, start = 0, len(messages)
+        lowest = max(self._folded, len(messages) - self.max_recent)
+        for i in range(len(messages) - 1, lowest - 1, -1):
+            cost = estimate_tokens(trim_message(messages[i]["content"], self.message_budget))
+            if start < len(messages) and used + cost > self.history_budget:
+                break
+            used += cost
+            start = i
+        return start
+
+    def _bound_summary(self) -> None:
+        # rolling: forget the oldest summary lines first
+        lines = self.summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_budget:
+            lines.pop(0)
+        self.summary = trim_message("\n".join(lines), self.summary_budget)
+
+    def update(self, messages: List[dict]) -> None:
+        """Fold newly evicted messages into the summary and cap `messages` in place."""
+        start = self._window_start(messages)
+        if start > self._folded:
+            self.summary = self.summarizer(self.summary, messages[self._folded:start])
+            self._bound_summary()
+            self._folded = start
+        # only messages that are already summarized may leave session state
+        drop = min(len(messages) - self.max_stored, self._folded)
+        if drop > 0:
+            del messages[:drop]
+            self._folded -= drop
+            self.dropped += drop
+
+    def context(self, messages: List[dict]) -> Tuple[str, List[dict]]:
+        """(summary of older turns, recent messages trimmed for the prompt)."""
+        self.update(messages)
+        recent = [{"role": m["role"], "content": trim_message(m["content"], self.message_budget)}
+                  for m in messages[self._folded:]]
+        return self.summary, recent
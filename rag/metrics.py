@@ -0,0 +1,167 @@
+# ===========================================
+# metrics.py — per-stage latency spans for each chat turn
+# Disabled by default; when off every span is a shared no-op object, so
+# instrumented code pays one attribute check and nothing else.
+# Exports: JSON lines (one object per turn) + a Prometheus text file.
+# ===========================================
+
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from typing import Dict, List, Optional
+
+# span attributes that measure output size and are summed into codex_stage_size_total;
+# parameters such as k, budget or mmr stay in turns.jsonl only
+SIZE_ATTRS = ("chunks", "passages", "context_tokens", "prompt_chars", "history_messages", "batch")
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, turn: "Turn", name: str, attrs: dict):
+        self.turn = turn
+        self.name = name
+        self.attrs = attrs
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.turn.add(self.name, (time.perf_counter() - self._t0) * 1000, **self.attrs)
+        return False
+
+    def set(self, **attrs) -> None:
+        """Attach sizes known only after the work (chunks, chars, ...)."""
+        self.attrs.update(attrs)
+
+
+class Turn:
+    """Spans collected for one chat turn, in the order they finished."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[dict] = []
+
+    def span(self, name: str, **attrs) -> Span:
+        return Span(self, name, attrs)
+
+    def add(self, name: str, ms: float, **attrs) -> None:
+        self.spans.append({"stage": name, "ms": round(ms, 3), **attrs})
+
+    def to_dict(self) -> dict:
+        # wall time of the whole rerun; spans may nest, so they are not summed
+        return {"ts": self.started, "total_ms": round((time.perf_counter() - self._t0) * 1000, 3), "spans": self.spans}
+
+
+# the turn being traced on this thread/context (None when tracing is off)
+_current: contextvars.ContextVar = contextvars.ContextVar("codex_turn", default=None)
+
+def span(name: str, **attrs):
+    """Span on the current turn; a no-op when no turn is active."""
+    turn = _current.get()
+    if turn is None:
+        return _NOOP
+    return turn.span(name, **attrs)
+
+
+class Tracer:
+    """
+    Process-wide collector. begin() starts a turn (or returns None when disabled),
+    record() exports it and keeps the last `keep` turns for the debug panel.
+    `enabled` is only the default; begin(enabled=...) decides per request, so
+    one shared Tracer can serve callers (e.g. app sessions) with their own setting.
+    """
+
+    def __init__(self, out_dir: str = "metrics", keep: int = 20, enabled: bool = None):
+        if enabled is None:
+            enabled = os.environ.get("CODEX_METRICS", "") not in ("", "0", "false")
+        self.enabled = enabled
+        self.out_dir = out_dir
+        self.recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._stage_ms: Dict[str, List[float]] = {}      # stage -> [sum_ms, count]
+        self._stage_sizes: Dict[tuple, float] = {}       # (stage, field) -> sum
+
+    def begin(self, enabled: bool = None) -> Optional[Turn]:
+        if not (self.enabled if enabled is None else enabled):
+            _current.set(None)
+            return None
+        turn = Turn()
+        _current.set(turn)
+        return turn
+
+    def record(self, turn: Optional[Turn]) -> Optional[dict]:
+        """Export a finished turn; returns its data (None when it was not traced)."""
+        _current.set(None)
+        if turn is None:
+            return None
+        data = turn.to_dict()
+        with self._lock:
+            self.recent.append(data)
+            self._turns += 1
+            for s in turn.spans:
+                agg = self._stage_ms.setdefault(s["stage"], [0.0, 0])
+                agg[0] += s["ms"]
+                agg[1] += 1
+                for field in SIZE_ATTRS:
+                    value = s.get(field)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        key = (s["stage"], field)
+                        self._stage_sizes[key] = self._stage_sizes.get(key, 0) + value
+            self._export(data)
+        return data
+
+    def discard(self) -> None:
+        _current.set(None)
+
+    # -------- exporters --------
+
+    def _export(self, data: dict) -> None:
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(os.path.join(self.out_dir, "turns.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            path = os.path.join(self.out_dir, "metrics.prom")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(path + ".tmp", path)
+        except OSError:
+            # metrics must never break a chat turn
+            pass
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP codex_turns_total Chat turns recorded.",
+            "# TYPE codex_turns_total counter",
+            f"codex_turns_total {self._turns}",
+            "# HELP codex_stage_seconds Time spent per chat-turn stage.",
+            "# TYPE codex_stage_seconds summary",
+        ]
+        for stage, (total_ms, count) in sorted(self._stage_ms.items()):
+            lines.append(f'codex_stage_seconds_sum{{stage="{stage}"}} {total_ms / 1000:.6f}')
+            lines.append(f'codex_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines += [
+            "# HELP codex_stage_size_total Summed sizes reported by stages (chunks, chars, ...).",
+            "# TYPE codex_stage_size_total counter",
+        ]
+        for (stage, field), value in sorted(self._stage_sizes.items()):
+            lines.append(f'codex_stage_size_total{{stage="{stage}",field="{field}"}} {value}')
+        return "\n".join(lines) + "\n"
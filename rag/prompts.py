@@ -1,29 +1,83 @@
-# prompts templates and modes for the Personal Codex app
-
-# base system instruction for the agent
-# this ensures responses are grounded in context and truthful
-BASE_SYSTEM = """You are Samukelo's Personal Codex Agent.
-- Answer strictly in first-person as Samukelo.
-- Ground answers in the provided CONTEXT when possible.
-- If the answer isn't in context, say so briefly and avoid fabrications.
-- DO NOT include any citations, doc numbers, bracketed numbers, or source markers (e.g., (Doc 1), [Doc 2], [1], URLs, footnotes).
-- Produce clean prose only."""
-
-# different answer styles (modes) the user can select in the UI
-# each mode changes tone, structure, and length of response
-MODES = {
-    "Interview mode": "Be concise, professional, specific. 3–6 sentences.",
-    "Personal storytelling mode": "Be reflective, narrative, 1–3 paragraphs, first-person.",
-    "Fast facts mode": "Answer in bullet points (3–7 bullets).",
-    "Humble brag mode": "Confident, measurable impact, crisp metrics if available."
-}
-
-# suggested sample questions for the sidebar dropdown
-# these help users test the chatbot quickly
-QUESTION_HINTS = [
-    "What kind of engineer are you?",
-    "Strongest technical skills?",
-    "Projects you’re most proud of?",
-    "What do you value in team/culture?",
-    "How do you learn or debug something new?"
-]
+# prompts templates and modes for the Personal Codex app
+
+# base system instruction for the agent
+# this ensures responses are grounded in context and truthful
+BASE_SYSTEM = """You are Samukelo's Personal Codex Agent.
+- Answer strictly in first-person as Samukelo.
+- Ground answers in the provided CONTEXT when possible.
+- If the answer isn't in context, say so briefly and avoid fabrications.
+- DO NOT include any citations, doc numbers, bracketed numbers, or source markers (e.g., (Doc 1), [Doc 2], [1], URLs, footnotes).
+- Produce clean prose only."""
+
+# different answer styles (modes) the user can select in the UI
+# each mode changes tone, structure, and length of response
+MODES = {
+    "Interview mode": "Be concise, professional, specific. 3–6 sentences.",
+    "Personal storytelling mode": "Be reflective, narrative, 1–3 paragraphs, first-person.",
+    "Fast facts mode": "Answer in bullet points (3–7 bullets).",
+    "Humble brag mode": "Confident, measurable impact, crisp metrics if available."
+}
+
+# suggested sample questions for the sidebar dropdown
+# these help users test the chatbot quickly
+QUESTION_HINTS = [
+    "What kind of engineer are you?",
+    "Strongest technical skills?",
+    "Projects you’re most proud of?",
+    "What do you value in team/culture?",
+    "How do you learn or debug something new?"
+]
+
+
+# prompt builder used by the app (and the benchmarks)
+def build_llm_prompt(
+    user_q: str,
+    retrieved_context: str,
+    mode_key: str,
+    chat_history: list[dict],
+    max_turns: int = 5,
+    summary: str = ""
+) -> str:
+    """
+    Creates the prompt for the LLM.
+    - Injects BASE_SYSTEM and the selected stylistic MODE.
+    - Includes the last `max_turns` of chat for light conversational memory.
+    - Adds a summary of older turns when one is given (see rag.memory).
+    - Adds retrieved context and current user question.
+    """
+    style = MODES[mode_key]
+
+    # Keep just the last N turns (each turn ~ user+assistant)
+    recent = chat_history[-max_turns * 2:]
+    history_lines = []
+    history_lines = [
+        f"{'User' if m['role']=='user' else 'Assistant'}: {m['content']}" for m in recent
+    ]
+    history_text = "\n".join(history_lines) if history_lines else "(no previous turns)"
+    summary_block = f"""EARLIER IN THIS CHAT (summary):
+\"\"\"
+{summary}
+\"\"\"
+
+""" if summary else ""
+
+    return f"""{BASE_SYSTEM}
+
+STYLE: {style}
+
+{summary_block}RECENT CHAT (for continuity):
+\"\"\"
+{history_text}
+\"\"\"
+
+CONTEXT (from Samukelo's docs):
+\"\"\"
+{retrieved_context}
+\"\"\"
+
+CURRENT QUESTION:
+{user_q}
+
+Answer as Samukelo (first-person). Be specific and grounded in the CONTEXT when applicable.
+If the answer is not in context, say so briefly and avoid fabrications.
+"""
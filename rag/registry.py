@@ -0,0 +1,161 @@
+# ===========================================
+# registry.py — bounded set of loaded index versions
+# Holds at most `max_versions` (vector store, sparse index) pairs keyed by
+# data signature. The newest version and versions leased by an in-flight
+# turn are never evicted; the rest go least-recently-used first, so old
+# versions stop piling up in memory after every upload.
+# ===========================================
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class IndexVersion:
+    signature: str
+    vs: Any
+    sparse: Any = None
+    refs: int = 0
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    index_bytes: Optional[int] = None      # FAISS index size (estimated from its shape) on first stats()
+    docstore_bytes: Optional[int] = None   # chunk text held in memory (0 for the mmap docstore)
+    mapped_bytes: Optional[int] = None     # docstore files mapped from disk (mmap format)
+
+
+def _docstore_bytes(vs) -> int:
+    store = getattr(getattr(vs, "docstore", None), "_dict", None)
+    if store is None:
+        return 0   # memory-mapped: pages belong to the OS cache, not our heap
+    return sum(len(doc.page_content.encode("utf-8")) for doc in store.values())
+
+def _mapped_bytes(vs) -> int:
+    """Size of the memory-mapped vectors/texts: resident only as far as the OS caches them."""
+    docstore = getattr(vs, "docstore", None)
+    arrays = (getattr(vs, "vectors", None), getattr(docstore, "_offsets", None), getattr(docstore, "_texts", None))
+    return sum(int(a.nbytes) for a in arrays if isinstance(a, np.memmap))
+
+def _index_bytes(vs) -> int:
+    from rag.index_types import index_bytes
+    try:
+        return index_bytes(vs.index)
+    except Exception:
+        return 0
+
+def process_rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux /proc); None where unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class IndexRegistry:
+    def __init__(self, max_versions: int = 2):
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, IndexVersion]" = OrderedDict()
+        self._current: Optional[str] = None      # last put(): the version being served
+
+    def put(self, signature: str, vs, sparse=None) -> IndexVersion:
+        """Register (or replace) a loaded version as the current one, then evict."""
+        version = IndexVersion(signature, vs, sparse)
+        with self._lock:
+            old = self._versions.pop(signature, None)
+            if old is not None:
+                version.refs = old.refs
+            self._versions[signature] = version
+            self._current = signature
+            self._evict()
+        return version
+
+    def get(self, signature: str) -> Optional[Tuple]:
+        with self._lock:
+            version = self._versions.get(signature)
+            if version is None:
+                return None
+            self._touch(version)
+            return version.vs, version.sparse
+
+    def __contains__(self, signature: str) -> bool:
+        with self._lock:
+            return signature in self._versions
+
+    # -------- leases (refcounts) --------
+
+    def acquire(self, signature: str) -> Optional[Tuple]:
+        """(vs, sparse) pinned against eviction until release(signature)."""
+        with self._lock:
+            version = self._versions.get(signature)
+            if version is None:
+                return None
+            version.refs += 1
+            self._touch(version)
+            return version.vs, version.sparse
+
+    def release(self, signature: str) -> None:
+        with self._lock:
+            version = self._versions.get(signature)
+            if version is not None and version.refs > 0:
+                version.refs -= 1
+            self._evict()
+
+    @contextmanager
+    def lease(self, signature: str):
+        pair = self.acquire(signature)
+        try:
+            yield pair
+        finally:
+            if pair is not None:
+                self.release(signature)
+
+    # -------- internals --------
+
+    def _touch(self, version: IndexVersion) -> None:
+        version.last_used = time.time()
+        self._versions.move_to_end(version.signature)
+
+    def _evict(self) -> None:
+        # least recently used first; leased versions survive until released, even past the cap
+        for sig in list(self._versions):
+            if len(self._versions) <= self.max_versions:
+                break
+            if sig != self._current and self._versions[sig].refs == 0:
+                del self._versions[sig]
+
+    # -------- reporting --------
+
+    def stats(self) -> dict:
+        with self._lock:
+            unmeasured = [v for v in self._versions.values() if v.index_bytes is None]
+        # measured outside the lock: summing a large in-memory docstore takes a while
+        for v in unmeasured:
+            v.index_bytes, v.docstore_bytes = _index_bytes(v.vs), _docstore_bytes(v.vs)
+            v.mapped_bytes = _mapped_bytes(v.vs)
+        with self._lock:
+            versions: List[dict] = [{
+                "signature": v.signature[:8],
+                "current": v.signature == self._current,
+                "refs": v.refs,
+                "vectors": int(getattr(v.vs.index, "ntotal", 0)),
+                "index_bytes": v.index_bytes or 0,
+                "docstore_bytes": v.docstore_bytes or 0,
+                "mapped_bytes": v.mapped_bytes or 0,
+                "loaded_at": v.loaded_at,
+                "last_used": v.last_used,
+            } for v in reversed(self._versions.values())]
+        return {
+            "versions": versions,
+            "max_versions": self.max_versions,
+            "index_bytes": sum(v["index_bytes"] + v["docstore_bytes"] for v in versions),
+            "mapped_bytes": sum(v["mapped_bytes"] for v in versions),
+            "rss_bytes": process_rss_bytes(),
+        }
@@ -0,0 +1,131 @@
+# ===========================================
+# response_cache.py — persistent semantic cache for LLM answers
+# An answer is reused when the new question is in the same answer mode,
+# was answered from the same retrieved chunks (hash of their ids) and
+# index version, and its query embedding is close enough to the cached
+# question's. SQLite on disk: shared by reruns, sessions and processes.
+# Entries expire after `ttl` seconds; past `max_entries` the least
+# recently used go first. Entries of other index versions are only
+# looked up by processes serving those versions (replicas mid-rollover)
+# and expire once none has used them for `stale_ttl` seconds.
+# ===========================================
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+# cosine similarity between query embeddings at which a cached answer is reused
+SIMILARITY_THRESHOLD = 0.92
+DEFAULT_TTL = 7 * 24 * 3600
+# unused this long, entries of an index version other than the writer's are dropped
+DEFAULT_STALE_TTL = 3600
+
+# follow-up cues: with earlier turns present, these questions lean on the conversation
+_FOLLOW_UP_RE = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|he|she|him|her|his|hers|there|then|"
+    r"more|else|again|also|above|previous|earlier|same|elaborate|why)\b", re.IGNORECASE)
+
+
+def chunk_id(doc) -> str:
+    """Stable id of a retrieved chunk: its source plus a hash of its text."""
+    source = doc.metadata.get("source", "")
+    page = doc.metadata.get("page", "")
+    return f"{source}:{page}:{hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()[:16]}"
+
+def context_key(docs) -> str:
+    """Hash of the ordered chunk ids a prompt was built from."""
+    return hashlib.sha1("\n".join(chunk_id(d) for d in docs).encode("utf-8")).hexdigest()
+
+def is_context_dependent(question: str, history: List[dict]) -> bool:
+    """
+    True when the earlier turns (`history`, without the question itself) probably shape
+    the answer, e.g. "why was that?"; a cached answer from another conversation would be wrong.
+    """
+    if not any(m.get("content") for m in history):
+        return False
+    return len(question.split()) < 4 or bool(_FOLLOW_UP_RE.search(question))
+
+
+class ResponseCache:
+    def __init__(self, path: str = ".cache/responses.sqlite", threshold: float = SIMILARITY_THRESHOLD,
+                 ttl: float = DEFAULT_TTL, max_entries: int = 2000, stale_ttl: float = DEFAULT_STALE_TTL):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # one connection shared by the app's threads; sqlite serializes writers across processes
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " id INTEGER PRIMARY KEY, model TEXT, mode TEXT, context TEXT, signature TEXT,"
+                " question TEXT, qvec BLOB, answer TEXT, created REAL, last_used REAL, hits INTEGER DEFAULT 0)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_key ON answers (model, mode, context, signature)")
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def get(self, query_vec, mode: str, context: str, signature: str, model: str = "") -> Optional[str]:
+        """Cached answer for a similar question over the same chunks, or None."""
+        q = self._unit(query_vec)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, qvec, answer FROM answers WHERE model=? AND mode=? AND context=? AND signature=?"
+                " AND created > ?", (model, mode, context, signature, now - self.ttl)).fetchall()
+            best, best_sim = None, self.threshold
+            for row_id, blob, answer in rows:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                if vec.shape != q.shape:
+                    continue   # written with another embedding model
+                sim = float(vec @ q)
+                if sim >= best_sim:
+                    best, best_sim = (row_id, answer), sim
+            if best is None:
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute("UPDATE answers SET last_used=?, hits=hits+1 WHERE id=?", (now, best[0]))
+            self.hits += 1
+            return best[1]
+
+    def put(self, question: str, query_vec, mode: str, context: str, signature: str, answer: str,
+            model: str = "") -> None:
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO answers (model, mode, context, signature, question, qvec, answer, created, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (model, mode, context, signature, question, self._unit(query_vec).tobytes(), answer, now, now))
+                self._db.execute("DELETE FROM answers WHERE created <= ?", (now - self.ttl,))
+                # other index versions: kept while some process (e.g. a replica not yet
+                # rolled over) still hits them, not wiped on the first mismatch
+                self._db.execute("DELETE FROM answers WHERE signature != ? AND last_used <= ?",
+                                 (signature, now - self.stale_ttl))
+                self._db.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used DESC"
+                    " LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM answers")
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
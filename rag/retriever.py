@@ -1,22 +1,363 @@
-from typing import List, Dict
-
-"""
-    retrieve top-k most similar chunks from the FAISS index for a given query.
-    args:
-        vs: FAISS vector store
-        query: user question
-        k: number of chunks to return (default 6)
-    returns:
-        context: concatenated string of retrieved content
-        docs: list of retrieved Document objects
-    """
-def retrieve(vs, query: str, k: int = 6):
-
-    # run similarity search
-    docs = vs.similarity_search(query, k=k)
-
-    # join results into a single string for LLM input
-    context = "\n\n".join(
-        [f"[Doc {i+1}]: {doc.page_content}" for i, doc in enumerate(docs)]
-    )
-    return context, docs
+import weakref
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict
+
+from rag.filters import normalize_filters
+from rag.metrics import span
+
+
+class LRU:
+    """Small thread-safe LRU map with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# query vectors only depend on the embedding model; results depend on the index,
+# so result keys carry the index signature: versions served side by side (leased
+# by in-flight turns) keep their own entries, and replaced ones age out of the LRU
+_EMBED_CACHE = LRU(maxsize=512)
+_RESULT_CACHE = LRU(maxsize=256)
+
+
+def normalize_query(query: str) -> str:
+    """Cache-key form of a query (case and whitespace folded)."""
+    return " ".join(query.lower().split())
+
+def _embed_query(vs, query: str) -> List[float]:
+    embedder = getattr(vs, "embeddings", None)
+    model = getattr(embedder, "model_name", None) or type(embedder).__name__
+    key = (model, normalize_query(query))
+    vec = _EMBED_CACHE.get(key)
+    if vec is None:
+        with span("embed_query"):
+            vec = embedder.embed_query(query) if embedder is not None else vs.embedding_function(query)
+        _EMBED_CACHE.put(key, vec)
+    return vec
+
+def query_embedding(vs, query: str) -> List[float]:
+    """The query vector retrieve() searches with (served from the cache after a retrieve)."""
+    return _embed_query(vs, query)
+
+# -------- hybrid (BM25 + dense) retrieval --------
+
+# reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+def _dense_ids_batch(vs, query_vecs, n: int) -> List[List[str]]:
+    """Top-n docstore ids per query, from one FAISS search over all of them."""
+    x = np.asarray(query_vecs, dtype=np.float32)
+    if getattr(vs, "_normalize_L2", False):
+        import faiss
+        faiss.normalize_L2(x)
+    _, idx = vs.index.search(x, n)
+    return [[vs.index_to_docstore_id[i] for i in row if i != -1] for row in idx]
+
+def _dense_ids(vs, query_vec, n: int, subset: "_Subset" = None) -> List[str]:
+    """Top-n docstore ids from the FAISS index (keeps ids, which similarity_search drops)."""
+    if subset is not None:
+        return _subset_dense_ids(vs, query_vec, n, subset)
+    return _dense_ids_batch(vs, [query_vec], n)[0]
+
+def _rrf(rankings: List[List[str]], k: int) -> List[str]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=lambda d: -scores[d])[:k]
+
+def _embed_queries(vs, queries: List[str]) -> List[List[float]]:
+    """Query vectors for many queries; cache misses go to the model in one batched call."""
+    embedder = getattr(vs, "embeddings", None)
+    if embedder is None:
+        return [_embed_query(vs, q) for q in queries]
+    model = getattr(embedder, "model_name", None) or type(embedder).__name__
+    keys = [(model, normalize_query(q)) for q in queries]
+    vecs = [_EMBED_CACHE.get(key) for key in keys]
+    missing = {}
+    for q, key, vec in zip(queries, keys, vecs):
+        if vec is None:
+            missing.setdefault(key, q)
+    if missing:
+        # sentence-transformers embeds a query exactly like a one-element document batch
+        with span("embed_query", batch=len(missing)):
+            fresh = dict(zip(missing, embedder.embed_documents(list(missing.values()))))
+        for key, vec in fresh.items():
+            _EMBED_CACHE.put(key, vec)
+        vecs = [vec if vec is not None else fresh[key] for key, vec in zip(keys, vecs)]
+    return vecs
+
+def _hybrid_search(vs, sparse, query: str, k: int, subset: "_Subset" = None):
+    fetch = max(k * 4, 20)
+    vec = _embed_query(vs, query)
+    with span("similarity_search", k=k, hybrid=True, filtered=subset is not None):
+        dense = _dense_ids(vs, vec, fetch, subset)
+        lexical = [doc_id for doc_id, _ in sparse.search(query, fetch, allowed=subset.ids if subset else None)]
+        fused = _rrf([dense, lexical], k)
+        return [vs.docstore.search(doc_id) for doc_id in fused]
+
+# -------- diversity re-ranking (MMR) --------
+
+# smallest candidate pool MMR re-ranks (the pool is max(4k, this))
+MMR_POOL = 20
+
+# docstore id -> row in the index, per loaded store
+_POSITIONS = weakref.WeakKeyDictionary()
+
+def _positions(vs) -> Dict[str, int]:
+    pos = _POSITIONS.get(vs)
+    if pos is None or len(pos) != len(vs.index_to_docstore_id):
+        pos = {doc_id: i for i, doc_id in vs.index_to_docstore_id.items()}
+        _POSITIONS[vs] = pos
+    return pos
+
+def _vectors_at(vs, rows: np.ndarray) -> np.ndarray:
+    """Stored vectors of index rows: the exact docstore/ copy when loaded, else from the index."""
+    stored = getattr(vs, "vectors", None)
+    if stored is not None:
+        return np.asarray(stored[rows], dtype=np.float32)
+    return vs.index.reconstruct_batch(rows)
+
+def vectors_for(vs, ids: List[str]) -> np.ndarray:
+    """Stored vectors of docstore ids (see _vectors_at)."""
+    pos = _positions(vs)
+    rows = np.fromiter((pos[i] for i in ids), dtype=np.int64, count=len(ids))
+    try:
+        return _vectors_at(vs, rows)
+    except RuntimeError:
+        # IVF without a direct map cannot reconstruct; re-embed the few candidates instead
+        embedder = getattr(vs, "embeddings", None) or vs.embedding_function
+        texts = [vs.docstore.search(i).page_content for i in ids]
+        return np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+
+def mmr_select(query_vec, cand_vecs, k: int, lambda_mult: float) -> List[int]:
+    """
+    Greedy maximal marginal relevance over cosine similarity.
+    lambda_mult=1 ranks by relevance only, 0 by diversity only. Returns candidate
+    indices in pick order; each step is a vector op over the pool, not a pair loop.
+    """
+    C = np.asarray(cand_vecs, dtype=np.float32)
+    C = C / np.maximum(np.linalg.norm(C, axis=1, keepdims=True), 1e-12)
+    q = np.asarray(query_vec, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    rel = C @ q
+    sim = C @ C.T
+    k = min(k, len(C))
+    first = int(np.argmax(rel))
+    picked = [first]
+    taken = np.zeros(len(C), dtype=bool)
+    taken[first] = True
+    max_sim = sim[:, first].copy()          # similarity to the closest already-picked chunk
+    while len(picked) < k:
+        score = lambda_mult * rel - (1.0 - lambda_mult) * max_sim
+        score[taken] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        taken[j] = True
+        np.maximum(max_sim, sim[:, j], out=max_sim)
+    return picked
+
+def candidate_ids(vs, sparse, query: str, query_vec, n: int, fetch: int = None,
+                  subset: "_Subset" = None) -> List[str]:
+    """Top-n docstore ids: dense ranking, fused with BM25 (RRF) when `sparse` is given."""
+    fetch = fetch or n
+    ids = _dense_ids(vs, query_vec, fetch, subset)
+    if sparse is not None:
+        lexical = sparse.search(query, fetch, allowed=subset.ids if subset else None)
+        ids = _rrf([ids, [doc_id for doc_id, _ in lexical]], n)
+    return ids[:n]
+
+def _mmr_search(vs, sparse, query: str, k: int, lambda_mult: float, subset: "_Subset" = None):
+    pool = max(k * 4, MMR_POOL)
+    vec = _embed_query(vs, query)
+    with span("similarity_search", k=k, hybrid=sparse is not None, mmr=lambda_mult, filtered=subset is not None):
+        ids = candidate_ids(vs, sparse, query, vec, pool, subset=subset)
+        if not ids:
+            return []
+        picked = mmr_select(vec, vectors_for(vs, ids), k, lambda_mult)
+        return [vs.docstore.search(ids[i]) for i in picked]
+
+# -------- metadata pre-filtering --------
+
+# subsets up to this many rows are scored exactly in numpy; larger ones use a FAISS IDSelector
+EXACT_SUBSET = 4096
+
+_METADATA = weakref.WeakKeyDictionary()
+
+def metadata_index(vs):
+    """Row metadata of a loaded store (attached at load time, else derived from its docstore once)."""
+    meta = getattr(vs, "metadata_index", None)
+    if meta is not None:
+        return meta
+    meta = _METADATA.get(vs)
+    if meta is None or len(meta) != len(vs.index_to_docstore_id):
+        from rag.filters import MetadataIndex
+        meta = MetadataIndex.from_store(vs)
+        _METADATA[vs] = meta
+    return meta
+
+class _Subset:
+    """Index rows (and their docstore ids) a filtered search is restricted to."""
+
+    def __init__(self, vs, rows: np.ndarray):
+        self.rows = rows.astype(np.int64)
+        self.ids = {vs.index_to_docstore_id[int(r)] for r in self.rows}
+
+def _subset_dense_ids(vs, query_vec, n: int, subset: _Subset) -> List[str]:
+    """Top-n ids among `subset` only; nothing outside it is fetched."""
+    import faiss
+    x = np.asarray([query_vec], dtype=np.float32)
+    if getattr(vs, "_normalize_L2", False):
+        faiss.normalize_L2(x)
+    rows = subset.rows
+    if len(rows) <= EXACT_SUBSET:
+        try:
+            vecs = _vectors_at(vs, rows)
+        except RuntimeError:
+            vecs = None   # IVF without a direct map: let faiss search the subset
+        if vecs is not None:
+            # exact L2 over the subset (the indexes here are all L2, see index_types)
+            dist = ((vecs - x) ** 2).sum(axis=1)
+            top = np.argsort(dist, kind="stable")[:n]
+            return [vs.index_to_docstore_id[int(rows[i])] for i in top]
+    sel = faiss.IDSelectorBatch(rows)
+    try:
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=faiss.extract_index_ivf(vs.index).nprobe)
+    except Exception:
+        params = faiss.SearchParameters(sel=sel)
+    _, idx = vs.index.search(x, n, params=params)
+    return [vs.index_to_docstore_id[int(i)] for i in idx[0] if i != -1]
+
+def cache_stats() -> Dict[str, int]:
+    return {
+        "embed_hits": _EMBED_CACHE.hits,
+        "embed_misses": _EMBED_CACHE.misses,
+        "embed_size": len(_EMBED_CACHE),
+        "result_hits": _RESULT_CACHE.hits,
+        "result_misses": _RESULT_CACHE.misses,
+        "result_size": len(_RESULT_CACHE),
+    }
+
+def clear_cache() -> None:
+    _EMBED_CACHE.clear()
+    _RESULT_CACHE.clear()
+
+
+"""
+    retrieve top-k most similar chunks from the FAISS index for a given query.
+    args:
+        vs: FAISS vector store
+        query: user question
+        k: number of chunks to return (default 6)
+        signature: data signature of the loaded index; enables the query cache
+        sparse: optional BM25Index; when given, BM25 and dense rankings are fused (RRF)
+        mmr_lambda: when set, re-rank a larger candidate pool with MMR (1 = relevance, 0 = diversity)
+        filters: optional metadata filter (see rag/filters.py), applied before the vector search
+    returns:
+        context: concatenated string of retrieved content
+        docs: list of retrieved Document objects
+    """
+def retrieve(vs, query: str, k: int = 6, signature: str = None, sparse=None, mmr_lambda: float = None,
+             filters: dict = None):
+
+    # serve repeated questions from the cache (only when we know the index version)
+    key = None
+    if signature is not None:
+        key = (normalize_query(query), k, signature, sparse is not None, mmr_lambda, normalize_filters(filters))
+        cached = _RESULT_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    # restrict the search to the rows matching the metadata filter
+    subset = None
+    rows = metadata_index(vs).rows(filters) if filters else None
+    if rows is not None:
+        if not len(rows):
+            return "", []
+        subset = _Subset(vs, rows)
+
+    # run similarity search (fused with BM25 when a sparse index is available)
+    if mmr_lambda is not None:
+        docs = _mmr_search(vs, sparse if sparse is not None and len(sparse) else None, query, k, mmr_lambda, subset)
+    elif sparse is not None and len(sparse):
+        docs = _hybrid_search(vs, sparse, query, k, subset)
+    else:
+        vec = _embed_query(vs, query)
+        with span("similarity_search", k=k, filtered=subset is not None):
+            if subset is not None:
+                docs = [vs.docstore.search(doc_id) for doc_id in _dense_ids(vs, vec, k, subset)]
+            else:
+                docs = vs.similarity_search_by_vector(vec, k=k)
+
+    # join results into a single string for LLM input
+    context = "\n\n".join(
+        [f"[Doc {i+1}]: {doc.page_content}" for i, doc in enumerate(docs)]
+    )
+    if key is not None:
+        _RESULT_CACHE.put(key, (context, docs))
+    return context, docs
+
+
+def retrieve_batch(vs, queries: List[str], k: int = 6, signature: str = None, sparse=None):
+    """
+    retrieve() for many queries at once: one batched embedding call for the
+    uncached queries and one FAISS search for all of them. Returns a list of
+    (context, docs) in the order of `queries`.
+    """
+    hybrid = sparse is not None and len(sparse)
+    results = [None] * len(queries)
+    todo = []
+    for i, q in enumerate(queries):
+        key = (normalize_query(q), k, signature, sparse is not None, None, None) if signature is not None else None
+        cached = _RESULT_CACHE.get(key) if key is not None else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            todo.append((i, q, key))
+    if not todo:
+        return results
+
+    vecs = _embed_queries(vs, [q for _, q, _ in todo])
+    fetch = max(k * 4, 20) if hybrid else k
+    with span("similarity_search", k=k, hybrid=bool(hybrid), batch=len(todo)):
+        dense = _dense_ids_batch(vs, vecs, fetch)
+        for (i, q, key), ids in zip(todo, dense):
+            if hybrid:
+                ids = _rrf([ids, [doc_id for doc_id, _ in sparse.search(q, fetch)]], k)
+            docs = [vs.docstore.search(doc_id) for doc_id in ids]
+            context = "\n\n".join(
+                [f"[Doc {n+1}]: {doc.page_content}" for n, doc in enumerate(docs)]
+            )
+            results[i] = (context, docs)
+            if key is not None:
+                _RESULT_CACHE.put(key, results[i])
+    return results
@@ -0,0 +1,327 @@
+# ===========================================
+# service.py — headless HTTP API over the RAG pipeline
+# POST /retrieve and POST /ask (JSON), GET /health.
+# Concurrent requests are micro-batched: a single loop collects pending
+# queries for up to `max_wait_ms` (or `max_batch` queries) and answers
+# them with one embedding call and one FAISS search.
+# With --corpora-dir, every subdirectory is served as its own (sharded)
+# index instead; requests may pick corpora with "corpora": [...].
+# On a single index, "filters": {"source": [...], ...} scopes the search
+# (see rag/filters.py); filtered queries skip the micro-batcher.
+# Usage:
+#   python -m rag.service --port 8000
+#   python -m rag.service --port 8000 --fake-llm     # load testing, no Gemini
+#   python -m rag.service --port 8000 --corpora-dir corpora --index-dir index/shards
+# ===========================================
+
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from rag.background import BackgroundIndexBuilder
+from rag.context import pack_context
+from rag.embeddings import HashingEmbeddings
+from rag.llm import FakeStreamingBackend, clean_answer, get_backend
+from rag.prompts import MODES, build_llm_prompt
+from rag.filters import normalize_filters
+from rag.retriever import retrieve, retrieve_batch
+from rag.shards import MAX_SHARD_BYTES, ShardedIndex, discover_corpora, plan_shards
+from rag.watcher import DataWatcher
+
+MAX_BODY_BYTES = 1 << 20
+# per-request caps: k bounds the FAISS result buffers, the budget the prompt size
+MAX_K = 50
+MAX_TOKEN_BUDGET = 8000
+
+
+class MicroBatcher:
+    """
+    Collects retrieval requests from many handler threads and runs them in batches.
+    submit() returns a Future resolving to (context, docs).
+    """
+
+    def __init__(self, builder: BackgroundIndexBuilder, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.builder = builder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stop = threading.Event()
+        self.batches = 0
+        self.queries = 0
+        self._thread = threading.Thread(target=self._loop, name="retrieve-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, k: int) -> Future:
+        future = Future()
+        self._queue.put((query, k, future))
+        return future
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "queries": self.queries,
+                "mean_batch": round(self.queries / self.batches, 2) if self.batches else 0.0}
+
+    def _collect(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch, deadline = [first], time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            # one embedding call for the whole batch; one FAISS search per distinct k
+            by_k = defaultdict(list)
+            for item in batch:
+                by_k[item[1]].append(item)
+            try:
+                with self.builder.lease() as (vs, sparse, sig):
+                    for k, items in by_k.items():
+                        # a failing group only fails its own requests
+                        try:
+                            if vs is None:
+                                raise RuntimeError("index not loaded")
+                            results = retrieve_batch(vs, [q for q, _, _ in items], k=k, signature=sig, sparse=sparse)
+                            for (_, _, future), result in zip(items, results):
+                                future.set_result(result)
+                        except Exception as e:
+                            _fail(items, e)
+            except Exception as e:
+                _fail(batch, e)
+            self.batches += 1
+            self.queries += len(batch)
+
+
+def _fail(items: list, error: Exception) -> None:
+    for _, _, future in items:
+        if not future.done():
+            future.set_exception(error)
+
+def _int_param(body: dict, key: str, default: int, lo: int, hi: int) -> int:
+    value = body.get(key, default)
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{key}' must be an integer") from None
+    if not lo <= value <= hi:
+        raise ValueError(f"'{key}' must be between {lo} and {hi}")
+    return value
+
+def _history_param(body: dict) -> List[dict]:
+    history = body.get("history") or []
+    if not isinstance(history, list) or not all(
+            isinstance(m, dict) and isinstance(m.get("role"), str) and isinstance(m.get("content"), str)
+            for m in history):
+        raise ValueError("'history' must be a list of {\"role\": str, \"content\": str} objects")
+    return history
+
+def _doc_json(doc) -> dict:
+    return {"content": doc.page_content, "metadata": doc.metadata}
+
+
+class RagService:
+    """Request handling shared by all HTTP handler threads."""
+
+    def __init__(self, builder: Optional[BackgroundIndexBuilder] = None, watcher: Optional[DataWatcher] = None,
+                 backend=None, max_batch: int = 32, max_wait_ms: float = 5.0, shards: Optional[ShardedIndex] = None):
+        if (builder is None) == (shards is None):
+            raise ValueError("pass either a builder or shards")
+        self.builder = builder
+        self.watcher = watcher
+        self.shards = shards
+        self.backend = backend or get_backend()
+        self.batcher = MicroBatcher(builder, max_batch=max_batch, max_wait_ms=max_wait_ms) if builder else None
+
+    def _refresh(self) -> None:
+        if self.shards is not None:
+            self.shards.refresh()
+        elif self.watcher is not None:
+            self.builder.request_rebuild(self.watcher.signature)
+
+    def _retrieve(self, query: str, k: int, body: dict):
+        if self.shards is not None:
+            corpora = body.get("corpora")
+            if corpora is not None and not isinstance(corpora, list):
+                raise ValueError("'corpora' must be a list")
+            return self.shards.search(query, k, names=corpora)
+        filters = body.get("filters")
+        if filters is not None and not isinstance(filters, dict):
+            raise ValueError("'filters' must be an object")
+        if normalize_filters(filters) is not None:
+            with self.builder.lease() as (vs, sparse, sig):
+                if vs is None:
+                    raise RuntimeError("index not loaded")
+                return retrieve(vs, query, k=k, signature=sig, sparse=sparse, filters=filters)
+        return self.batcher.submit(query, k).result()
+
+    def retrieve(self, body: dict) -> dict:
+        query = str(body.get("query") or "").strip()
+        if not query:
+            raise ValueError("'query' is required")
+        k = _int_param(body, "k", 5, 1, MAX_K)
+        self._refresh()
+        context, docs = self._retrieve(query, k, body)
+        return {"context": context, "docs": [_doc_json(d) for d in docs]}
+
+    def ask(self, body: dict) -> dict:
+        query = str(body.get("query") or "").strip()
+        if not query:
+            raise ValueError("'query' is required")
+        mode = body.get("mode") or next(iter(MODES))
+        if mode not in MODES:
+            raise ValueError(f"'mode' must be one of {list(MODES)}")
+        k = _int_param(body, "k", 5, 1, MAX_K)
+        budget = _int_param(body, "token_budget", 1200, 1, MAX_TOKEN_BUDGET)
+        history = _history_param(body)
+        self._refresh()
+        t0 = time.perf_counter()
+        # over-fetch like the app; the packer trims to the token budget
+        _, docs = self._retrieve(query, k * 2, body)
+        context, passages = pack_context(docs, token_budget=budget)
+        t1 = time.perf_counter()
+        prompt = build_llm_prompt(query, context, mode, history + [{"role": "user", "content": query}])
+        answer = clean_answer(self.backend.generate(prompt))
+        t2 = time.perf_counter()
+        return {
+            "answer": answer,
+            "sources": sorted({d.metadata.get("source") for p in passages for d in p.docs if d.metadata.get("source")}),
+            "timings_ms": {"retrieve": round((t1 - t0) * 1000, 3), "generate": round((t2 - t1) * 1000, 3)},
+        }
+
+    def health(self) -> dict:
+        if self.shards is not None:
+            return {"shards": self.shards.status()}
+        return {"index": self.builder.status(), "batcher": self.batcher.stats()}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the socketserver default (5) resets connections under concurrent load
+    request_queue_size = 256
+
+
+def make_handler(service: RagService):
+    routes = {"/retrieve": service.retrieve, "/ask": service.ask}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: dict) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._send(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self._send(413, {"error": "request body too large"})
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+            try:
+                self._send(200, route(body))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            # keep load tests quiet; errors are returned to the client
+            pass
+
+    return Handler
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Local HTTP API: POST /retrieve, POST /ask, GET /health.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--index-dir", default="index")
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--max-batch", type=int, default=32, help="max queries per embedding/search batch")
+    ap.add_argument("--max-wait-ms", type=float, default=5.0, help="how long a batch waits to fill up")
+    ap.add_argument("--fake-llm", action="store_true", help="answer with a fixed stub instead of Gemini")
+    ap.add_argument("--hashing-embeddings", action="store_true",
+                    help="offline HashingEmbeddings instead of MiniLM (use a separate --index-dir)")
+    ap.add_argument("--corpora-dir", help="serve each subdirectory as its own corpus (--index-dir holds the shards)")
+    ap.add_argument("--max-shard-mb", type=float, default=MAX_SHARD_BYTES / (1 << 20),
+                    help="corpora larger than this are split into several shards")
+    args = ap.parse_args(argv)
+
+    build_kwargs = {"embeddings": HashingEmbeddings()} if args.hashing_embeddings else {}
+    backend = FakeStreamingBackend(["(stub answer) ", "see the retrieved context."]) if args.fake_llm else None
+    watcher = shards = None
+    if args.corpora_dir:
+        specs = plan_shards(discover_corpora(args.corpora_dir), index_root=args.index_dir,
+                            max_shard_bytes=int(args.max_shard_mb * (1 << 20)))
+        shards = ShardedIndex(specs, docstore_format="mmap", **build_kwargs)
+        shards.ensure_loaded()
+        service = RagService(backend=backend, shards=shards)
+    else:
+        watcher = DataWatcher(args.data_dir, verify_hashes=True).start()
+        builder = BackgroundIndexBuilder(index_dir=args.index_dir, data_dir=args.data_dir, docstore_format="mmap",
+                                         **build_kwargs)
+        builder.ensure_loaded(watcher.signature)
+        service = RagService(builder, watcher, backend=backend, max_batch=args.max_batch,
+                             max_wait_ms=args.max_wait_ms)
+
+    server = _Server((args.host, args.port), make_handler(service))
+    print(f"Serving on http://{args.host}:{args.port} (max_batch={args.max_batch}, max_wait_ms={args.max_wait_ms})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if shards is not None:
+            shards.close()
+        else:
+            service.batcher.stop()
+            watcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# ===========================================
+# shards.py — several corpora / size-bounded shards behind one search
+# Every shard is an ordinary index directory with its own manifest.json,
+# background builder and rebuild cycle, so a large corpus rebuilding
+# never holds up the others. search() fans a query out to the selected
+# shards in a thread pool (FAISS releases the GIL) and merges by score.
+# Layout:
+#   corpora/<name>/...           one corpus per subdirectory
+#   index/shards/<name>          its index (or <name>.<i>of<n> when split)
+# ===========================================
+
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag.background import BackgroundIndexBuilder
+from rag.build_index import Shard, _list_data_files
+from rag.metrics import span
+from rag.retriever import (MMR_POOL, LRU, candidate_ids, mmr_select, normalize_query, query_embedding,
+                           vectors_for)
+from rag.watcher import DataWatcher
+
+# corpora larger than this (bytes on disk) are split into several shards
+MAX_SHARD_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class ShardSpec:
+    name: str                      # "<corpus>" or "<corpus>/<i>of<n>"
+    corpus: str
+    data_dir: str
+    index_dir: str
+    shard: Optional[Shard] = None  # None: the whole corpus
+
+
+def discover_corpora(root: str = "corpora") -> Dict[str, str]:
+    """corpus name -> data dir, one per (non-hidden) subdirectory of `root`."""
+    if not os.path.isdir(root):
+        return {}
+    return {name: os.path.join(root, name) for name in sorted(os.listdir(root))
+            if not name.startswith(".") and os.path.isdir(os.path.join(root, name))}
+
+def plan_shards(corpora: Dict[str, str], index_root: str = "index/shards",
+                max_shard_bytes: int = MAX_SHARD_BYTES) -> List[ShardSpec]:
+    """
+    One shard per corpus, or ceil(size / max_shard_bytes) hash-partitioned shards for
+    large ones. Changing a corpus's shard count gives it fresh index directories.
+    """
+    specs = []
+    for corpus, data_dir in sorted(corpora.items()):
+        size = sum(os.path.getsize(p) for p in _list_data_files(data_dir))
+        count = max(1, math.ceil(size / max_shard_bytes))
+        if count == 1:
+            specs.append(ShardSpec(corpus, corpus, data_dir, os.path.join(index_root, corpus)))
+            continue
+        for i in range(count):
+            specs.append(ShardSpec(f"{corpus}/{i}of{count}", corpus, data_dir,
+                                   os.path.join(index_root, f"{corpus}.{i}of{count}"), shard=(i, count)))
+    return specs
+
+
+class ShardedIndex:
+    """
+    Serves a set of shards. Extra kwargs (embeddings, docstore_format, index_type, ...)
+    go to every shard's BackgroundIndexBuilder; all shards must share one embedding model.
+    """
+
+    def __init__(self, specs: List[ShardSpec], max_workers: int = None, verify_hashes: bool = True, **build_kwargs):
+        if not specs:
+            raise ValueError("no shards to serve")
+        self.specs = {spec.name: spec for spec in specs}
+        self.watchers = {d: DataWatcher(d, verify_hashes=verify_hashes).start()
+                         for d in sorted({spec.data_dir for spec in specs})}
+        self.builders = {spec.name: BackgroundIndexBuilder(index_dir=spec.index_dir, data_dir=spec.data_dir,
+                                                           shard=spec.shard, **build_kwargs)
+                         for spec in specs}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(len(specs), os.cpu_count() or 1),
+                                        thread_name_prefix="shard-search")
+        self._cache = LRU(maxsize=256)
+
+    # -------- selection / lifecycle --------
+
+    @property
+    def corpora(self) -> List[str]:
+        return sorted({spec.corpus for spec in self.specs.values()})
+
+    def select(self, names: Iterable[str] = None) -> List[ShardSpec]:
+        """Shards matching corpus or shard names (all shards for None)."""
+        if not names:
+            return list(self.specs.values())
+        names = set(names)
+        unknown = names - set(self.specs) - set(self.corpora)
+        if unknown:
+            raise ValueError(f"unknown corpora/shards: {sorted(unknown)}")
+        return [spec for spec in self.specs.values() if spec.name in names or spec.corpus in names]
+
+    def _signature(self, spec: ShardSpec) -> str:
+        return self.watchers[spec.data_dir].shard_signature(spec.shard)
+
+    def ensure_loaded(self) -> None:
+        """Load (or first-build) every shard, in parallel; later changes rebuild in the background."""
+        specs = list(self.specs.values())
+        list(self._pool.map(lambda s: self.builders[s.name].ensure_loaded(self._signature(s)), specs))
+
+    def refresh(self) -> None:
+        """Queue a rebuild for each shard whose data changed; each shard rebuilds on its own."""
+        for spec in self.specs.values():
+            self.builders[spec.name].request_rebuild(self._signature(spec))
+
+    def status(self) -> Dict[str, dict]:
+        return {name: builder.status() for name, builder in self.builders.items()}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        for watcher in self.watchers.values():
+            watcher.stop()
+
+    # -------- search --------
+
+    @staticmethod
+    def _search_shard(spec: ShardSpec, vs, sparse, query: str, query_vec, n: int):
+        """(cosine scores, vectors, docs) of one shard's top-n candidates."""
+        sparse = sparse if sparse is not None and len(sparse) else None
+        ids = candidate_ids(vs, sparse, query, query_vec, n, fetch=max(n * 4, 20) if sparse is not None else n)
+        if not ids:
+            return np.zeros(0, dtype=np.float32), None, []
+        vecs = vectors_for(vs, ids)
+        vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        docs = []
+        for doc_id in ids:
+            doc = vs.docstore.search(doc_id)
+            docs.append(Document(page_content=doc.page_content,
+                                 metadata={**doc.metadata, "corpus": spec.corpus, "shard": spec.name}))
+        return vecs @ query_vec, vecs, docs
+
+    def search(self, query: str, k: int = 6, names: Iterable[str] = None,
+               mmr_lambda: float = None) -> Tuple[str, List[Document]]:
+        """
+        Top-k chunks across the selected shards as (context, docs), like retrieve().
+        Each shard ranks its own candidates (hybrid when it has BM25); the merge orders
+        them by cosine similarity to the query, or re-ranks the merged pool with MMR.
+        """
+        specs = self.select(names)
+        with ExitStack() as stack:
+            live = []
+            for spec in specs:
+                vs, sparse, sig = stack.enter_context(self.builders[spec.name].lease())
+                if vs is not None:
+                    live.append((spec, vs, sparse, sig))
+            if not live:
+                return "", []
+
+            key = (normalize_query(query), k, mmr_lambda, tuple((spec.name, sig) for spec, _, _, sig in live))
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+
+            # embed once up front; the shards' own lookups then hit the query cache
+            q = np.asarray(query_embedding(live[0][1], query), dtype=np.float32)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            n = max(k * 4, MMR_POOL) if mmr_lambda is not None else k
+            with span("shard_search", shards=len(live), k=k):
+                futures = [self._pool.submit(self._search_shard, spec, vs, sparse, query, q, n)
+                           for spec, vs, sparse, _ in live]
+                parts = [f.result() for f in futures]
+
+        scores = np.concatenate([s for s, _, _ in parts])
+        docs = [d for _, _, ds in parts for d in ds]
+        if not docs:
+            result = ("", [])
+        else:
+            if mmr_lambda is not None:
+                pool = np.argsort(-scores, kind="stable")[:n]
+                vecs = np.concatenate([v for _, v, _ in parts if v is not None])[pool]
+                order = [int(pool[i]) for i in mmr_select(q, vecs, k, mmr_lambda)]
+            else:
+                order = [int(i) for i in np.argsort(-scores, kind="stable")[:k]]
+            picked = [docs[i] for i in order]
+            context = "\n\n".join(f"[Doc {i+1}]: {doc.page_content}" for i, doc in enumerate(picked))
+            result = (context, picked)
+        self._cache.put(key, result)
+        return result
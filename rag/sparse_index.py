@@ -0,0 +1,179 @@
+# ===========================================
+# sparse_index.py — BM25 inverted index kept next to index.faiss
+# Catches exact-name queries (people, project names) that dense search misses.
+# Saving back to the directory it was loaded from appends only the changes
+# to bm25.log.jsonl; the log is folded into bm25.json once it grows large.
+# ===========================================
+
+import os
+import re
+import json
+import math
+import uuid
+from collections import Counter
+from typing import Container, Dict, List, Optional, Tuple
+
+SPARSE_FILE = "bm25.json"
+SPARSE_LOG = "bm25.log.jsonl"
+# rewrite bm25.json once the log holds this share of the indexed chunks
+COMPACT_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over chunk ids. Supports add/remove so incremental builds stay cheap."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}   # term -> {doc_id: tf}
+        self.doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        # set while the files in _dir match this index up to _pending (log records, not yet written)
+        self._dir: Optional[str] = None
+        self._generation = ""                # of that bm25.json; its log starts with the same one
+        self._pending: List[dict] = []
+        self._logged = 0                     # doc ids already in that log
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: str, text: str) -> None:
+        self._add_counts(doc_id, dict(Counter(tokenize(text))))
+
+    def _add_counts(self, doc_id: str, counts: Dict[str, int]) -> None:
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.doc_len[doc_id] = length
+        self._total_len += length
+        self._log({"add": doc_id, "tf": counts})
+
+    def remove(self, doc_id: str) -> None:
+        if doc_id not in self.doc_len:
+            return
+        self._total_len -= self.doc_len.pop(doc_id)
+        self._log({"remove": [doc_id]})
+        for term in list(self.postings):
+            docs = self.postings[term]
+            if docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[term]
+
+    def remove_many(self, doc_ids: List[str]) -> None:
+        drop = {d for d in doc_ids if d in self.doc_len}
+        if not drop:
+            return
+        for d in drop:
+            self._total_len -= self.doc_len.pop(d)
+        self._log({"remove": sorted(drop)})
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for d in drop.intersection(docs):
+                del docs[d]
+            if not docs:
+                del self.postings[term]
+
+    def _log(self, op: dict) -> None:
+        if self._dir is not None:
+            self._pending.append(op)
+
+    def search(self, query: str, k: int = 10, allowed: Container[str] = None) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, score); with `allowed`, only those doc ids are scored."""
+        n = len(self.doc_len)
+        if n == 0:
+            return []
+        avg_len = self._total_len / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+
+    # -------- persistence --------
+
+    def save(self, index_dir: str) -> None:
+        """Append the changes since load/save to the log, or rewrite bm25.json in full."""
+        path = os.path.join(index_dir, SPARSE_FILE)
+        log_path = os.path.join(index_dir, SPARSE_LOG)
+        changed = sum(1 if "add" in op else len(op["remove"]) for op in self._pending)
+        if (self._dir == os.path.abspath(index_dir) and os.path.exists(path)
+                and self._logged + changed <= COMPACT_RATIO * max(1, len(self))):
+            if self._pending:
+                with open(log_path, "a", encoding="utf-8") as f:
+                    if f.tell() == 0:
+                        f.write(json.dumps({"generation": self._generation}) + "\n")
+                    f.writelines(json.dumps(op, ensure_ascii=False) + "\n" for op in self._pending)
+            self._logged += changed
+        else:
+            tmp = path + ".tmp"
+            self._generation = uuid.uuid4().hex
+            payload = {"k1": self.k1, "b": self.b, "generation": self._generation,
+                       "doc_len": self.doc_len, "postings": self.postings}
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            if os.path.exists(log_path):
+                os.remove(log_path)
+            self._logged = 0
+        self._pending = []
+        self._dir = os.path.abspath(index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["BM25Index"]:
+        path = os.path.join(index_dir, SPARSE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception:
+            return None
+        idx = cls(k1=payload.get("k1", 1.5), b=payload.get("b", 0.75))
+        idx.doc_len = payload.get("doc_len", {})
+        idx.postings = payload.get("postings", {})
+        idx._total_len = sum(idx.doc_len.values())
+        idx._generation = payload.get("generation", "")
+        intact = idx._replay(os.path.join(index_dir, SPARSE_LOG))
+        # a stale or torn log is not appended to: the next save rewrites bm25.json
+        idx._dir = os.path.abspath(index_dir) if intact else None
+        return idx
+
+    def _replay(self, log_path: str) -> bool:
+        """Apply the change log of this bm25.json; False if it is stale or ends in a torn record."""
+        if not os.path.exists(log_path):
+            return True
+        with open(log_path, "r", encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return False
+            if header.get("generation") != self._generation:
+                return False                # left over from before bm25.json was rewritten
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    return False
+                if "add" in op:
+                    self._add_counts(op["add"], op["tf"])
+                else:
+                    self.remove_many(op["remove"])
+                self._logged += 1 if "add" in op else len(op["remove"])
+        return True
+
+
+def load_sparse_index(index_dir: str = "index") -> Optional[BM25Index]:
+    return BM25Index.load(index_dir)
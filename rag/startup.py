@@ -0,0 +1,216 @@
+# ===========================================
+# startup.py — cold-start profile and background warm-up
+# StartupProfile times module imports (self time, grouped by top-level
+# package, like `python -X importtime`) and marks milestones since the
+# process started: first render, index ready, warm, first answer. The
+# report is rewritten to metrics/startup.json at every milestone.
+# WarmUp loads the index, the embedding model and the LLM client and runs
+# a dummy query off the request path, so neither the first render nor the
+# first question pays for them.
+# Usage (regression check without Streamlit):
+#   python -m rag.startup --hashing-embeddings --index-dir index_hash
+# ===========================================
+
+import os
+import sys
+import json
+import time
+import argparse
+import builtins
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+STARTUP_REPORT = os.path.join("metrics", "startup.json")
+
+
+def _process_start() -> float:
+    """Wall-clock start of this process (Linux /proc); falls back to now."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupProfile:
+    """Import timings + startup milestones for one process (see `startup_profile`)."""
+
+    def __init__(self, path: str = STARTUP_REPORT):
+        self.path = path
+        self.started_at = _process_start()
+        self.marks: Dict[str, float] = {}
+        self._self_ms: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    # -------- import timing --------
+
+    def install(self) -> None:
+        """Start timing imports (idempotent). Only imports of not-yet-loaded modules are timed."""
+        if self._original_import is not None or "first_answer" in self.marks:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self) -> None:
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import or builtins.__import__
+        if level == 0 and name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        label = name
+        if level:
+            # relative import: attribute it to the importing package
+            label = (globals or {}).get("__package__") or name
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)                   # time spent in nested imports
+        t0 = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - t0
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self._self_ms[label.split(".")[0]] += (elapsed - nested) * 1000
+
+    def imports(self, top: int = 15) -> List[dict]:
+        with self._lock:
+            ranked = sorted(self._self_ms.items(), key=lambda kv: -kv[1])
+        return [{"package": pkg, "ms": round(ms, 1)} for pkg, ms in ranked[:top] if ms >= 0.05]
+
+    # -------- milestones --------
+
+    def mark(self, name: str) -> None:
+        """Record a milestone once (seconds since process start) and rewrite the report."""
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = time.time() - self.started_at
+        if name == "first_answer":
+            # nothing left to measure; stop paying for the import hook
+            self.uninstall()
+        self.save()
+
+    def report(self) -> dict:
+        with self._lock:
+            marks = {k: round(v * 1000, 1) for k, v in self.marks.items()}
+            total = round(sum(self._self_ms.values()), 1)
+        return {"milestones_ms": marks, "import_ms_total": total, "imports": self.imports(),
+                "pid": os.getpid(), "started_at": self.started_at}
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=2)
+        except OSError:
+            pass
+
+
+# one per process; survives Streamlit reruns because the module stays imported
+startup_profile = StartupProfile()
+
+
+class WarmUp:
+    """
+    Background warm-up: load the index for `signature()`, then run `query` through
+    retrieval (loads the embedding model and faults in the index) and prepare the
+    LLM client. Failures are kept in `error`; the app then just loads on demand.
+    """
+
+    def __init__(self, builder, signature: Callable[[], str], backend=None, query: str = "warm-up",
+                 profile: StartupProfile = None):
+        self.builder = builder
+        self.signature = signature
+        self.backend = backend
+        self.query = query
+        self.profile = profile or startup_profile
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+
+    def start(self) -> "WarmUp":
+        self._thread.start()
+        return self
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _run(self) -> None:
+        try:
+            self.builder.ensure_loaded(self.signature())
+            self.profile.mark("index_ready")
+            from rag.retriever import retrieve
+            with self.builder.lease() as (vs, sparse, _):
+                if vs is not None:
+                    # no signature: the dummy query must not land in the result cache
+                    retrieve(vs, self.query, k=1, sparse=sparse)
+            warm = getattr(self.backend, "warm", None)
+            if warm is not None:
+                warm()
+            self.profile.mark("warm")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self._done.set()
+
+
+def main(argv: List[str] = None) -> int:
+    """Profile a cold start of the serving path: imports, warm-up, first answer (fake LLM)."""
+    ap = argparse.ArgumentParser(description="Cold-start profile: import times, warm-up and first answer.")
+    ap.add_argument("--index-dir", default="index")
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--hashing-embeddings", action="store_true",
+                    help="offline HashingEmbeddings instead of MiniLM (use a separate --index-dir)")
+    ap.add_argument("--out", default=STARTUP_REPORT)
+    args = ap.parse_args(argv)
+
+    profile = startup_profile
+    profile.path = args.out
+    profile.install()
+    # the modules app.py imports at startup
+    from rag.background import BackgroundIndexBuilder
+    from rag.watcher import DataWatcher
+    from rag.context import pack_context
+    from rag.prompts import MODES, build_llm_prompt
+    from rag.llm import FakeStreamingBackend, stream_answer
+    from rag.retriever import retrieve
+    profile.mark("first_render")
+
+    build_kwargs = {}
+    if args.hashing_embeddings:
+        from rag.embeddings import HashingEmbeddings
+        build_kwargs["embeddings"] = HashingEmbeddings()
+    watcher = DataWatcher(args.data_dir, verify_hashes=True).start()
+    builder = BackgroundIndexBuilder(index_dir=args.index_dir, data_dir=args.data_dir, docstore_format="mmap",
+                                     **build_kwargs)
+    backend = FakeStreamingBackend(["(stub answer)"])
+    WarmUp(builder, lambda: watcher.signature, backend=backend).start().wait()
+
+    question = "What kind of engineer are you?"
+    with builder.lease() as (vs, sparse, sig):
+        _, docs = retrieve(vs, question, k=6, signature=sig, sparse=sparse)
+    context, _ = pack_context(docs)
+    prompt = build_llm_prompt(question, context, next(iter(MODES)), [{"role": "user", "content": question}])
+    "".join(stream_answer(backend, prompt))
+    profile.mark("first_answer")
+    watcher.stop()
+    print(json.dumps(profile.report(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
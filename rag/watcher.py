@@ -0,0 +1,233 @@
+# ===========================================
+# watcher.py — event-driven change detection for data/
+# Keeps the data signature in memory and updates it only when files
+# change, so reruns read a string instead of walking and stat-ing data/.
+# Linux: inotify (via ctypes); elsewhere, or if inotify is unavailable,
+# a background polling thread.
+# ===========================================
+
+import os
+import errno
+import select
+import struct
+import ctypes
+import threading
+from typing import Dict, Iterable, Optional
+
+from rag.build_index import (Shard, _is_data_file, _list_data_files, _rel_path, _stat_entry,
+                             hash_files, in_shard, signature_from_entries)
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+               | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal recursive inotify reader: one watch per directory under root."""
+
+    def __init__(self, root: str):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}
+        self.add_tree(root)
+
+    def add_tree(self, top: str) -> None:
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(root), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOENT:
+                    continue
+                # ENOSPC: out of watches (fs.inotify.max_user_watches)
+                raise OSError(err, f"inotify_add_watch failed for {root}")
+            self.dirs[wd] = root
+
+    def read(self, timeout: float):
+        """Yield (mask, path) for pending events; waits up to `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, pos)
+            pos += _EVENT_HEADER.size
+            name = buf[pos:pos + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            pos += length
+            if mask & _IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            base = self.dirs.get(wd)
+            if base is None and not mask & _IN_Q_OVERFLOW:
+                continue
+            yield mask, os.path.join(base, name) if base and name else base
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class DataWatcher:
+    """
+    In-memory data signature for `data_dir`, kept current by a background thread.
+    `signature` is what get_data_signature() would return, except with verify_hashes=True:
+    files are then fingerprinted by content (sha256, hashed in parallel), so touching a
+    file without changing it does not change the signature or trigger a rebuild.
+    """
+
+    def __init__(self, data_dir: str = "data", verify_hashes: bool = False, poll_interval: float = 2.0,
+                 use_inotify: bool = True, workers: int = None):
+        self.data_dir = data_dir
+        self.verify_hashes = verify_hashes
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.workers = workers
+        self.mode: Optional[str] = None          # "inotify" | "polling" once started
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}       # rel path -> {"path", "size", "mtime"[, "sha256"]}
+        self._signature = ""
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------- reading --------
+
+    @property
+    def signature(self) -> str:
+        with self._lock:
+            return self._signature
+
+    def shard_signature(self, shard: Optional[Shard]) -> str:
+        """Signature of one shard's slice of data_dir (the whole directory for None)."""
+        with self._lock:
+            if shard is None:
+                return self._signature
+            entries = [e for rel, e in self._entries.items() if in_shard(rel, shard)]
+        return self._signature_of(entries)
+
+    # -------- lifecycle --------
+
+    def start(self) -> "DataWatcher":
+        os.makedirs(self.data_dir, exist_ok=True)
+        notifier = None
+        if self.use_inotify:
+            try:
+                notifier = _Inotify(self.data_dir)
+            except (OSError, AttributeError):
+                notifier = None
+        # scan after the watches exist so nothing slips in between
+        self.rescan()
+        self.mode = "inotify" if notifier is not None else "polling"
+        target = (lambda: self._run_inotify(notifier)) if notifier is not None else self._run_polling
+        self._thread = threading.Thread(target=target, name="data-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    # -------- updates --------
+
+    def _fingerprint(self, paths: Iterable[str], previous: Dict[str, dict]) -> Dict[str, dict]:
+        """Entries for `paths`; content hashes are recomputed only when size/mtime moved."""
+        entries, to_hash = {}, []
+        for path in paths:
+            try:
+                entry = _stat_entry(path, self.data_dir)
+            except FileNotFoundError:
+                continue
+            old = previous.get(entry["path"])
+            if self.verify_hashes:
+                if old is not None and old["size"] == entry["size"] and old["mtime"] == entry["mtime"]:
+                    entry["sha256"] = old["sha256"]
+                else:
+                    to_hash.append(path)
+            entries[entry["path"]] = entry
+        if to_hash:
+            for path, digest in hash_files(to_hash, self.workers).items():
+                entries[_rel_path(path, self.data_dir)]["sha256"] = digest
+        return entries
+
+    def _signature_of(self, entries) -> str:
+        if self.verify_hashes:
+            # content fingerprint: a touch-only mtime change keeps the signature
+            entries = [{"path": e["path"], "size": e["size"], "sha256": e["sha256"]} for e in entries]
+        return signature_from_entries(entries)
+
+    def _publish(self, entries: Dict[str, dict]) -> None:
+        signature = self._signature_of(entries.values())
+        with self._lock:
+            self._entries = entries
+            self._signature = signature
+
+    def rescan(self) -> str:
+        """Full walk of data_dir (startup, queue overflow, polling, explicit refresh)."""
+        with self._lock:
+            previous = dict(self._entries)
+        self._publish(self._fingerprint(_list_data_files(self.data_dir), previous))
+        return self.signature
+
+    def _apply(self, changed: Iterable[str]) -> None:
+        with self._lock:
+            previous = dict(self._entries)
+        entries = dict(previous)
+        changed = set(changed)
+        for path in changed:
+            entries.pop(_rel_path(path, self.data_dir), None)
+        present = [p for p in changed if os.path.isfile(p)]
+        entries.update(self._fingerprint(present, previous))
+        self._publish(entries)
+
+    def _run_inotify(self, notifier: _Inotify) -> None:
+        try:
+            while not self._stop.is_set():
+                changed, rescan = set(), False
+                for mask, path in notifier.read(timeout=0.5):
+                    if mask & _IN_Q_OVERFLOW:
+                        rescan = True
+                    elif mask & _IN_ISDIR:
+                        # a directory appeared/disappeared/moved: its whole subtree changed
+                        if mask & (_IN_CREATE | _IN_MOVED_TO) and os.path.isdir(path):
+                            notifier.add_tree(path)
+                        rescan = True
+                    elif path and _is_data_file(_rel_path(path, self.data_dir)):
+                        changed.add(path)
+                if rescan:
+                    self.rescan()
+                elif changed:
+                    self._apply(changed)
+        except OSError:
+            # e.g. out of inotify watches: keep going by polling
+            self.mode = "polling"
+            self._run_polling()
+        finally:
+            notifier.close()
+
+    def _run_polling(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.rescan()
+            except OSError:
+                # data_dir briefly missing/unreadable; try again next tick
+                continue
@@ -1,92 +1,199 @@
-import os
-from typing import List, Dict
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.chat_models import ChatOpenAI
-
-class QAAgent:
-    def __init__(self, mode: str = "default"):
-        self.llm = ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0.7 if mode == "creative" else 0.1
-        )
-        self.embeddings = OpenAIEmbeddings()
-        self.vector_store = Chroma(
-            persist_directory="./chroma_db", 
-            embedding_function=self.embeddings
-        )
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        self.mode = mode
-        self.setup_prompts()
-
-    def setup_prompts(self):
-        if self.mode == "interview":
-            self.prompt_template = """
-                You are Samukelo Mkhize’s Personal Codex Agent.
-                Answer questions truthfully based only on the documents provided.
-                Speak in Samukelo’s authentic voice: professional, reflective, concise but human.
-
-                If you don't know the answer, just say "Hmm, I'm not sure." Don't try to make up an answer.
-                If the question is not about Samukelo, politely inform them that you are only able
-                to answer questions about Samukelo based on the provided documents.
-
-                {context}
-
-                Question: {question}
-                Answer in a concise and human manner.
-                Answer:"""
-        
-        elif self.mode == "storytelling":
-            self.prompt_template = """You are telling a story based on the following information.
-                Weave the facts into an engaging narrative.
-
-                {context}
-
-                Question: {question}
-                Answer:
-            """
-
-        else:  # default
-            self.prompt_template = """You are a helpful assistant.
-                Use the following pieces of context to answer the question at the end.
-                If you don't know the answer, just say "Hmm, I'm not sure." Don't try to make up an answer.
-
-                {context}
-
-                Question: {question}
-                Answer:"""
-            
-        self.QA_PROMPT = PromptTemplate(
-            template=self.prompt_template,
-            input_variables=["context", "question"]
-        )
-
-    def get_qa_chain(self):
-        retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}
-        )
-
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=retriever,
-            memory=self.memory,
-            combine_docs_chain_kwargs={"prompt": self.QA_PROMPT}
-        )
-
-        return qa_chain
-    
-    def ask_question(self, question: str) -> str:
-        qa_chain = self.get_qa_chain()
-        result = qa_chain({"question": question})
-        return result['answer']
-    
-    def clear_memory(self):
+import os
+import threading
+from typing import Any, Callable, List, Dict, Optional
+from langchain.prompts import PromptTemplate
+from langchain.memory import ConversationBufferMemory
+from langchain.chains import ConversationalRetrievalChain
+from langchain_community.vectorstores import Chroma
+from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_community.chat_models import ChatOpenAI
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.retrievers import BaseRetriever
+
+BACKENDS = ("chroma", "faiss")
+
+# One embedding model, vector store and LLM client per process, shared by every
+# QAAgent whatever its mode; keyed like rag.llm.get_backend's cache.
+_SHARED: Dict[tuple, Any] = {}
+_SHARED_LOCK = threading.Lock()
+
+def _shared(key: tuple, factory: Callable[[], Any]) -> Any:
+    with _SHARED_LOCK:
+        if key not in _SHARED:
+            _SHARED[key] = factory()
+        return _SHARED[key]
+
+
+class BackendLLM(LLM):
+    """LangChain LLM over a rag.llm backend (GeminiBackend, FakeStreamingBackend, ...)."""
+    backend: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "codex-backend"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return self.backend.generate(prompt)
+
+
+class IndexRetriever(BaseRetriever):
+    """Retriever over the local FAISS index from rag/build_index.py (dense or hybrid)."""
+    builder: Any
+    watcher: Any = None
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        from rag.retriever import retrieve
+        if self.watcher is not None:
+            # changed data is rebuilt in the background; the current version keeps serving
+            self.builder.request_rebuild(self.watcher.signature)
+        with self.builder.lease() as (vs, sparse, signature):
+            _, docs = retrieve(vs, query, k=self.k, signature=signature, sparse=sparse)
+        return docs
+
+
+def _local_index(index_dir: str, data_dir: str, embeddings):
+    """
+    Builder + watcher over the index, set up like app.py's: the same content-hash
+    signature, so the app and agents sharing index/ agree on its version, and
+    rebuilds go through a copy + swap instead of overwriting mapped files.
+    """
+    from rag.background import BackgroundIndexBuilder
+    from rag.watcher import DataWatcher
+    watcher = DataWatcher(data_dir, verify_hashes=True).start()
+    builder = BackgroundIndexBuilder(index_dir=index_dir, data_dir=data_dir, docstore_format="mmap",
+                                     embeddings=embeddings)
+    builder.ensure_loaded(watcher.signature)
+    return builder, watcher
+
+def _default_embeddings(backend: str):
+    if backend == "faiss":
+        from rag.build_index import EMBED_MODEL
+        from rag.embeddings import get_embeddings
+        return get_embeddings(EMBED_MODEL)
+    return OpenAIEmbeddings()
+
+
+class QAAgent:
+    """
+    backend="chroma" uses ./chroma_db with OpenAI embeddings (as before); backend="faiss"
+    uses the local index built by rag/build_index.py. `llm` may be any LangChain model or
+    anything with generate(prompt) -> str (e.g. rag.llm.FakeStreamingBackend for offline runs).
+    """
+
+    def __init__(self, mode: str = "default", backend: str = "chroma", llm: Any = None,
+                 embeddings=None, index_dir: str = "index", data_dir: str = "data", k: int = 3):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        temperature = 0.7 if mode == "creative" else 0.1
+        if llm is None:
+            llm = _shared(("llm", "gpt-3.5-turbo", temperature),
+                          lambda: ChatOpenAI(model_name="gpt-3.5-turbo", temperature=temperature))
+        elif not isinstance(llm, BaseLanguageModel):
+            llm = BackendLLM(backend=llm)
+        self.llm = llm
+        if embeddings is None:
+            embeddings = _shared(("embeddings", backend), lambda: _default_embeddings(backend))
+        self.embeddings = embeddings
+        model_name = getattr(embeddings, "model_name", None) or type(embeddings).__name__
+        if backend == "faiss":
+            # the builder serves whichever version matches the data now (see IndexRetriever)
+            self.builder, self.watcher = _shared(
+                ("store", backend, os.path.abspath(index_dir), model_name),
+                lambda: _local_index(index_dir, data_dir, embeddings))
+        else:
+            self.vector_store = _shared(
+                ("store", backend, os.path.abspath("./chroma_db"), model_name),
+                lambda: Chroma(persist_directory="./chroma_db", embedding_function=embeddings))
+        self.backend = backend
+        self.k = k
+        self.memory = ConversationBufferMemory(
+            memory_key="chat_history",
+            return_messages=True
+        )
+        self.mode = mode
+        self.setup_prompts()
+        # built once; ask_question reuses it, ask_questions uses a memory-less twin
+        self.qa_chain = self._build_chain(memory=self.memory)
+        self._batch_chain = None
+
+    def setup_prompts(self):
+        if self.mode == "interview":
+            self.prompt_template = """
+                You are Samukelo Mkhize’s Personal Codex Agent.
+                Answer questions truthfully based only on the documents provided.
+                Speak in Samukelo’s authentic voice: professional, reflective, concise but human.
+
+                If you don't know the answer, just say "Hmm, I'm not sure." Don't try to make up an answer.
+                If the question is not about Samukelo, politely inform them that you are only able
+                to answer questions about Samukelo based on the provided documents.
+
+                {context}
+
+                Question: {question}
+                Answer in a concise and human manner.
+                Answer:"""
+        
+        elif self.mode == "storytelling":
+            self.prompt_template = """You are telling a story based on the following information.
+                Weave the facts into an engaging narrative.
+
+                {context}
+
+                Question: {question}
+                Answer:
+            """
+
+        else:  # default
+            self.prompt_template = """You are a helpful assistant.
+                Use the following pieces of context to answer the question at the end.
+                If you don't know the answer, just say "Hmm, I'm not sure." Don't try to make up an answer.
+
+                {context}
+
+                Question: {question}
+                Answer:"""
+            
+        self.QA_PROMPT = PromptTemplate(
+            template=self.prompt_template,
+            input_variables=["context", "question"]
+        )
+
+    def _retriever(self) -> BaseRetriever:
+        if self.backend == "faiss":
+            return IndexRetriever(builder=self.builder, watcher=self.watcher, k=self.k)
+        return self.vector_store.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": self.k}
+        )
+
+    def _build_chain(self, memory=None):
+        return ConversationalRetrievalChain.from_llm(
+            llm=self.llm,
+            retriever=self._retriever(),
+            memory=memory,
+            combine_docs_chain_kwargs={"prompt": self.QA_PROMPT}
+        )
+
+    def get_qa_chain(self):
+        return self.qa_chain
+    
+    def ask_question(self, question: str) -> str:
+        result = self.qa_chain.invoke({"question": question})
+        return result['answer']
+
+    def ask_questions(self, questions: List[str], max_concurrency: int = 4) -> List[str]:
+        """Answer independent questions (no shared chat memory), at most `max_concurrency` at a time."""
+        if self._batch_chain is None:
+            self._batch_chain = self._build_chain(memory=None)
+        results = self._batch_chain.batch(
+            [{"question": q, "chat_history": []} for q in questions],
+            config={"max_concurrency": max_concurrency}
+        )
+        return [r['answer'] for r in results]
+    
+    def clear_memory(self):
         self.memory.clear()
\ No newline at end of file